@@ -0,0 +1,15 @@
+"""Настройки тестов под pytest (pytest-django).
+
+pytest-django не использует TEST_RUNNER, поэтому то, что делает
+core.testing.TestRunner, повторяем здесь.
+"""
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def query_budget_raises(django_test_environment):
+    """В тестах превышение бюджета запросов роняет запрос."""
+    from django.conf import settings
+
+    from core.queries import RAISE
+    settings.QUERY_BUDGET_MODE = RAISE
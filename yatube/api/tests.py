@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+from posts.models import Group, Post, User
+
+
+class PostApiTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api', description='Описание')
+        for number in range(13):
+            Post.objects.create(
+                author=cls.user, text=f'Пост {number}',
+                group=cls.group if number % 2 else None)
+        cls.post = Post.objects.latest('pk')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feed_pages(self):
+        """Лента отдаётся страницами по курсору без пересечений."""
+        url = reverse('api:post_list')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 13)
+        self.assertEqual(first['results'][0]['text'], 'Пост 12')
+        self.assertEqual(first['results'][0]['author'], 'reader')
+
+    def test_sparse_fields(self):
+        """?fields= ограничивает и ответ, и столбцы запроса."""
+        url = reverse('api:post_list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,author'})
+        self.assertQueryCount(response, 1)
+        self.assertEqual(
+            list(response.json()['results'][0]), ['id', 'author'])
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertIn('"username"', sql)
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_group_and_user_feeds(self):
+        response = self.client.get(
+            reverse('api:group_posts', args=[self.group.slug]),
+            {'fields': 'group', 'limit': 100})
+        self.assertQueryCount(response, 2)
+        self.assertEqual(len(response.json()['results']), 6)
+        response = self.client.get(
+            reverse('api:user_posts', args=[self.user.username]))
+        self.assertEqual(len(response.json()['results']), 10)
+        response = self.client.get(
+            reverse('api:group_posts', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_detail(self):
+        response = self.client.get(
+            reverse('api:post_detail', args=[self.post.pk]))
+        self.assertQueryCount(response, 1)
+        self.assertEqual(response.json()['text'], self.post.text)
+        self.assertIsNone(response.json()['image'])
+        response = self.client.get(reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_detail_follows_author_rename(self):
+        """Ответ из кэша страниц сбрасывается при смене имени автора."""
+        url = reverse('api:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.client.get(url).json()['author'], 'renamed')
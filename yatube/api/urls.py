@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.post_list, name='post_list'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'groups/<slug:slug>/posts/',
+        views.group_posts, name='group_posts'),
+    path(
+        'users/<str:username>/posts/',
+        views.user_posts, name='user_posts'),
+]
@@ -0,0 +1,158 @@
+"""JSON API только для чтения: ленты и посты.
+
+Строки сериализуются прямо из .values(), без создания моделей, а
+?fields=id,text ограничивает и ответ, и столбцы в SELECT. Ленты
+пагинируются курсором (?after=/?before=), как и HTML-страницы.
+"""
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+
+from core.middleware import tag_page
+from core.queries import query_budget
+from core.replicas import replica_reads
+from posts import cache
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# Имя поля в ответе → путь в ORM.
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Без них не посчитать курсор; в ответ попадают, только если запрошены.
+CURSOR_FIELDS = ('pub_date', 'id')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def requested_fields(request):
+    """Поля из ?fields= в порядке запроса; по умолчанию — все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(FIELDS)
+    fields = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(FIELDS)}.')
+    return fields
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('limit должен быть числом.')
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def select(queryset, fields, *extra):
+    """values() только с нужными столбцами, связи — через JOIN."""
+    return queryset.values(*[FIELDS[name] for name in fields], *extra)
+
+
+def serialize(rows, fields):
+    results = []
+    for row in rows:
+        item = {name: row[FIELDS[name]] for name in fields}
+        if 'image' in item:
+            item['image'] = (
+                default_storage.url(item['image']) if item['image'] else None)
+        results.append(item)
+    return results
+
+
+def page_url(request, **params):
+    query = request.GET.copy()
+    for name in ('after', 'before'):
+        query.pop(name, None)
+    query.update(params)
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def feed(request, queryset):
+    """Страница ленты: результаты и ссылки на соседние страницы."""
+    try:
+        fields = requested_fields(request)
+        size = page_size(request)
+    except BadRequest as exc:
+        return error(str(exc))
+    rows = select(queryset, list(dict.fromkeys([*fields, *CURSOR_FIELDS])))
+    paginator = CursorPaginator(
+        rows, size, transform=lambda rows: serialize(rows, fields))
+    page = paginator.get_page(
+        request.GET.get('after'), request.GET.get('before'))
+    return JsonResponse({
+        'results': list(page),
+        'next': (
+            page_url(request, after=page.next_cursor)
+            if page.has_next() else None),
+        'previous': (
+            page_url(request, before=page.previous_cursor)
+            if page.has_previous() else None),
+    })
+
+
+@query_budget(1)
+@replica_reads
+def post_list(request):
+    tag_page(request, cache.GLOBAL_SCOPE)
+    return feed(request, Post.objects.all())
+
+
+@query_budget(2)
+@replica_reads
+def group_posts(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug).values_list('id', flat=True).first()
+    if group_id is None:
+        return error('Группа не найдена.', status=404)
+    tag_page(request, cache.group_scope(group_id))
+    return feed(request, Post.objects.filter(group_id=group_id))
+
+
+@query_budget(2)
+@replica_reads
+def user_posts(request, username):
+    author_id = User.objects.filter(
+        username=username).values_list('id', flat=True).first()
+    if author_id is None:
+        return error('Пользователь не найден.', status=404)
+    tag_page(request, cache.author_scope(author_id))
+    return feed(request, Post.objects.filter(author_id=author_id))
+
+
+@query_budget(1)
+@replica_reads
+def post_detail(request, post_id):
+    try:
+        fields = requested_fields(request)
+    except BadRequest as exc:
+        return error(str(exc))
+    tag_page(request, cache.post_scope(post_id))
+    row = select(
+        Post.objects.filter(pk=post_id), fields, 'author_id', 'group_id',
+    ).first()
+    if row is None:
+        return error('Пост не найден.', status=404)
+    # Ответ зависит и от имени автора, и от группы.
+    tag_page(request, cache.author_scope(row['author_id']))
+    if row['group_id']:
+        tag_page(request, cache.group_scope(row['group_id']))
+    return JsonResponse(serialize([row], fields)[0])
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'key', 'status', 'attempts', 'run_at', 'finished',)
+    list_filter = ('status', 'name',)
+    search_fields = ('name', 'key',)
+    readonly_fields = ('created', 'finished', 'last_error',)
+
+
+admin.site.register(Job, JobAdmin)
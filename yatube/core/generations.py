@@ -0,0 +1,61 @@
+"""Счётчики поколений для инвалидации кэша по областям (scopes).
+
+Ключ закэшированного фрагмента включает поколения областей, от которых
+он зависит. Чтобы «сбросить» все такие фрагменты, достаточно увеличить
+поколение области — старые записи просто перестают читаться и со
+временем вытесняются.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'generation'
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def _fresh():
+    # Новое поколение берём из часов, а не с единицы: после вытеснения
+    # счётчика из кэша он не совпадёт ни с одним из прежних значений.
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes):
+    """Текущие поколения областей одним обращением к кэшу."""
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, scope in keys.items():
+        if key not in found:
+            cache.add(key, _fresh(), timeout=None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def version(*scopes):
+    """Поколения областей одной строкой — для ключа кэша."""
+    versions = get_versions(*scopes)
+    return '.'.join(str(versions[scope]) for scope in scopes)
+
+
+def bump(*scopes):
+    """Делаем устаревшим всё, что закэшировано для областей."""
+    for scope in set(scopes):
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.set(_key(scope), _fresh(), timeout=None)
+
+
+def bump_on_commit(*scopes):
+    """Сбрасываем области сразу и ещё раз после коммита транзакции.
+
+    Повторный сброс убирает фрагменты, которые успели закэшировать
+    с ещё не закоммиченными данными между первым сбросом и коммитом.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
@@ -0,0 +1,203 @@
+"""Очередь фоновых задач в таблице базы (модель core.Job).
+
+Задача — функция, помеченная декоратором @task; в очередь она
+ставится методом enqueue() с аргументами, которые сохраняются в JSON.
+Строка задачи пишется в текущую транзакцию: воркер увидит задачу
+только после её фиксации, а при откате она пропадёт вместе с данными.
+Поэтому ставить задачи можно прямо из сигналов моделей.
+
+Воркер (команда run_jobs) забирает готовые задачи условным UPDATE,
+так что одну задачу не возьмут два потока. Упавшая задача
+повторяется с растущей паузой, после max_attempts попыток получает
+статус failed. Задача, воркер которой умер, снова становится
+доступна, когда истекает locked_until. Поэтому задачи должны
+спокойно переносить повторный запуск.
+
+Ключ дедупликации (key) не даёт поставить вторую такую же задачу,
+пока первая ждёт в очереди. Задачу с задержкой (delay) воркер
+возьмёт не раньше назначенного времени.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import (
+    IntegrityError, OperationalError, connections, transaction)
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 30
+LOCK_SECONDS = 10 * 60
+# Сколько готовых задач смотрим за раз, если соседние потоки
+# перехватили первые.
+CLAIM_WINDOW = 20
+# Пауза потока, если база занята соседом дольше busy_timeout.
+LOCKED_PAUSE = 0.1
+
+registry = {}
+
+job_finished = Signal(providing_args=['job'])
+job_failed = Signal(providing_args=['job', 'error'])
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def enqueue(self, *args, key='', delay=0):
+        """Ставим задачу в очередь в текущей транзакции.
+
+        Если задача с тем же key уже ждёт, новую не создаём. Это один
+        INSERT ... ON CONFLICT DO NOTHING, без точки сохранения,
+        поэтому ставить задачу из сигнала на каждую запись дёшево.
+        """
+        job = Job(
+            name=self.name,
+            arguments=json.dumps(args),
+            key=key,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        Job.objects.bulk_create([job], ignore_conflicts=bool(key))
+
+
+def task(name=None, max_attempts=3, retry_delay=RETRY_DELAY):
+    """Регистрируем функцию как фоновую задачу."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = Task(
+            func, task_name, max_attempts, retry_delay)
+        return registry[task_name]
+    return decorator
+
+
+def claim(lock_seconds=LOCK_SECONDS):
+    """Забираем одну готовую задачу или None, если таких нет."""
+    now = timezone.now()
+    ready = Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+    candidates = ready.order_by('run_at', 'id').values_list('pk', flat=True)
+    for pk in candidates[:CLAIM_WINDOW]:
+        claimed = ready.filter(pk=pk).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=lock_seconds),
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def perform(job):
+    """Выполняем забранную задачу, True — если успешно."""
+    # Условие по attempts: если задачу, пока она шла, забрал другой
+    # воркер (истёк locked_until), её судьбу решает он.
+    running = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts)
+    task = registry.get(job.name)
+    try:
+        if task is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Воркер не завершил последнюю попытку')
+        task.func(*json.loads(job.arguments))
+    except Exception as error:
+        logger.exception('Задача %s (попытка %s) упала', job, job.attempts)
+        retry_or_fail(job, running, task, error)
+        return False
+    if running.update(
+            status=Job.DONE, finished=timezone.now(), locked_until=None):
+        job_finished.send(sender=Job, job=job)
+    return True
+
+
+def retry_or_fail(job, running, task, error):
+    now = timezone.now()
+    if task is not None and job.attempts < job.max_attempts:
+        delay = task.retry_delay * 2 ** (job.attempts - 1)
+        try:
+            with transaction.atomic():
+                if running.update(
+                        status=Job.PENDING, locked_until=None,
+                        run_at=now + timedelta(seconds=delay),
+                        last_error=repr(error)):
+                    return
+        except IntegrityError:
+            # Такую же задачу уже поставили заново, повтор не нужен.
+            pass
+    if running.update(
+            status=Job.FAILED, finished=now, locked_until=None,
+            last_error=repr(error)):
+        job_failed.send(sender=Job, job=job, error=error)
+
+
+def run_pending(stop=None, poll_interval=None):
+    """Выполняем задачи в текущем потоке, возвращаем их число.
+
+    Без poll_interval выходим, когда готовых задач не осталось,
+    иначе ждём новых, пока не выставлен stop.
+    """
+    stop = stop or threading.Event()
+    count = 0
+    while not stop.is_set():
+        try:
+            job = claim()
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            stop.wait(LOCKED_PAUSE)
+            continue
+        if job is not None:
+            perform(job)
+            count += 1
+        elif poll_interval is None:
+            break
+        else:
+            stop.wait(poll_interval)
+    return count
+
+
+def _worker_thread(stop, poll_interval):
+    try:
+        return run_pending(stop, poll_interval)
+    finally:
+        # Подключения к базе у каждого потока свои.
+        connections.close_all()
+
+
+def run_workers(workers, stop=None, poll_interval=None):
+    """Выполняем задачи в пуле из workers потоков."""
+    stop = stop or threading.Event()
+    with ThreadPoolExecutor(workers, thread_name_prefix='jobs') as pool:
+        futures = [
+            pool.submit(_worker_thread, stop, poll_interval)
+            for _ in range(workers)
+        ]
+    return sum(future.result() for future in futures)
+
+
+def purge(days):
+    """Удаляем задачи, выполненные больше days дней назад."""
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE,
+        finished__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
@@ -0,0 +1,40 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди фоновых задач: выполняет задачи из core.Job '
+        'в пуле потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4, help='Число потоков.')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между проверками пустой очереди, секунды.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.')
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help='Сколько дней хранить выполненные задачи.')
+
+    def handle(self, *args, **options):
+        purged = jobs.purge(options['keep_days'])
+        if purged:
+            self.stdout.write(f'Удалено старых задач: {purged}')
+        stop = threading.Event()
+        if not options['once']:
+            # SIGTERM и Ctrl+C дают потокам доделать текущие задачи.
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *args: stop.set())
+        done = jobs.run_workers(
+            max(options['workers'], 1), stop,
+            None if options['once'] else options['poll_interval'])
+        self.stdout.write(f'Выполнено задач: {done}')
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание SQLite: переносит WAL в базу и обрезает его, '
+        'обновляет статистику планировщика (ANALYZE).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию один раз).')
+        parser.add_argument(
+            '--skip-analyze', action='store_true',
+            help='Только контрольная точка WAL.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite.')
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                busy, log, checkpointed = cursor.fetchone()
+                self.stdout.write(
+                    f'WAL: страниц {log}, перенесено {checkpointed}'
+                    + (', база занята' if busy else ''))
+                if not options['skip_analyze']:
+                    start = time.perf_counter()
+                    cursor.execute('ANALYZE')
+                    cursor.execute('PRAGMA optimize')
+                    self.stdout.write(
+                        'ANALYZE: '
+                        f'{(time.perf_counter() - start) * 1000:.0f} мс')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
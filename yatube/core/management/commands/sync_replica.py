@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.replicas import PRIMARY, get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в реплики SQLite через backup API: '
+        'копия согласована, даже если в primary в это время пишут.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (по умолчанию один раз).')
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Сколько страниц копировать за шаг backup.')
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_REPLICA.')
+        for alias in [PRIMARY, *replicas]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: поддерживается только SQLite')
+        while True:
+            for alias in replicas:
+                start = time.perf_counter()
+                self.sync(alias, options['pages'])
+                self.stdout.write(
+                    f'{alias}: {(time.perf_counter() - start) * 1000:.0f} мс')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sync(alias, pages):
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        # Своё подключение к реплике Django закрываем: backup заменяет
+        # файл целиком.
+        connections[alias].close()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            primary.connection.backup(target, pages=pages)
+        finally:
+            target.close()
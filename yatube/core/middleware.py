@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from . import generations
+from .replicas import PRIMARY
+
+PAGE_KEY_PREFIX = 'page:v3'
+
+
+def tag_page(request, *scopes):
+    """Помечаем страницу областями, от которых зависит её содержимое.
+
+    Поколения снимаются до того, как view прочитает данные: если пост
+    изменится во время рендера, сохранённая страница сразу устареет.
+    Без пометок страница в кэш не попадает.
+    """
+    tags = getattr(request, 'page_cache_tags', None)
+    if tags is not None:
+        tags.update(generations.get_versions(*scopes))
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для анонимных GET-запросов без cookies.
+
+    Запись хранит версии областей страницы (tag_page) и отдаётся, только
+    пока все они актуальны, поэтому изменение поста, комментария, группы
+    или подписки сразу убирает зависящие от них страницы. Попадание
+    в кэш не трогает ни сессии, ни ORM, ни шаблоны. Вместе со страницей
+    хранятся её заголовки: middleware ниже по списку (X-Frame-Options
+    и прочие) на попадании не выполняются, а их заголовки нужны.
+    На совпавший If-None-Match с сохранённым ETag отдаём 304.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def is_cacheable(request):
+        return (
+            request.method == 'GET'
+            and not request.COOKIES
+            and 'HTTP_AUTHORIZATION' not in request.META
+        )
+
+    @staticmethod
+    def cache_key(request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'{PAGE_KEY_PREFIX}:{path}'
+
+    def __call__(self, request):
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 0)
+        if not timeout or not self.is_cacheable(request):
+            return self.get_response(request)
+        key = self.cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            content, headers, tags = entry
+            if generations.get_versions(*tags) == tags:
+                response = HttpResponse(content)
+                for header, value in headers:
+                    response[header] = value
+                etag = response.get('ETag')
+                if etag:
+                    # Клиенту с тем же ETag отвечаем 304 без тела.
+                    response = get_conditional_response(
+                        request, etag=etag, response=response)
+                response['X-Page-Cache'] = 'hit'
+                return response
+        request.page_cache_tags = {}
+        response = self.get_response(request)
+        if (
+            request.page_cache_tags
+            # Страница с отстающей реплики устарела бы под новыми тегами.
+            and getattr(request, 'read_database', PRIMARY) == PRIMARY
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        ):
+            cache.set(key, (
+                response.content, list(response.items()),
+                request.page_cache_tags,
+            ), timeout)
+        return response
@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди (core/jobs.py)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не удалась'),
+    ]
+
+    name = models.CharField('Задача', max_length=200)
+    arguments = models.TextField('Аргументы (JSON)', default='[]')
+    key = models.CharField(
+        'Ключ дедупликации', max_length=255, blank=True,
+        help_text='Пока задача с этим ключом ждёт, вторая не ставится')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=PENDING)
+    run_at = models.DateTimeField('Выполнить не раньше', default=timezone.now)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Максимум попыток', default=3)
+    locked_until = models.DateTimeField(
+        'Занята воркером до', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status='pending') & ~models.Q(key=''),
+                name='unique pending job key'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at', 'id'],
+                name='job_status_run_at'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
@@ -0,0 +1,56 @@
+"""Проверка планов SQL-запросов через EXPLAIN QUERY PLAN (SQLite).
+
+PlanRecorder подключается как execute_wrapper и запоминает SELECT-ы
+с параметрами; explain() спрашивает у SQLite план каждого из них,
+а problems() находит в плане полный просмотр таблицы или сортировку
+во временном B-дереве — то, что на больших таблицах растёт с данными.
+"""
+from contextlib import ExitStack
+
+from django.db import connections
+
+TEMP_SORT = 'USE TEMP B-TREE'
+# Просмотры, которые полными не считаем: одна строка, подзапрос
+# или виртуальная таблица FTS со своим индексом.
+SCAN_EXCEPTIONS = ('CONSTANT ROW', 'SUBQUERY', 'VIRTUAL TABLE')
+
+
+class PlanRecorder:
+    """SELECT-ы, выполненные за время record(), с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    def record(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+def explain(sql, params=(), using='default'):
+    """Строки плана запроса (поле detail EXPLAIN QUERY PLAN)."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    # SQLite 3.36 пишет «SCAN t», более старые — «SCAN TABLE t».
+    if not detail.startswith('SCAN'):
+        return False
+    return 'USING' not in detail and not any(
+        exception in detail for exception in SCAN_EXCEPTIONS)
+
+
+def problems(plan):
+    """Строки плана с полным просмотром таблицы или временной сортировкой."""
+    return [
+        detail for detail in plan
+        if is_full_scan(detail) or TEMP_SORT in detail
+    ]
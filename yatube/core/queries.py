@@ -0,0 +1,138 @@
+"""Учёт SQL-запросов за время обработки запроса и бюджеты запросов view.
+
+Бюджет объявляется декоратором @query_budget(n) рядом с view. Middleware
+QueryBudgetMiddleware считает запросы всех подключений, их общее время
+и повторяющиеся «формы» запросов (SQL без параметров), а при превышении
+бюджета пишет предупреждение или падает — см. QUERY_BUDGET_MODE. Падать
+стоит только в тестах (core.testing.TestRunner): к этому моменту view
+уже всё записал, и пользователь получил бы 500 на сохранённые данные.
+
+Работа, которая растёт вместе с данными (раскладка поста по лентам
+подписчиков), выполняется в outside_budget(): её запросы считаются
+отдельно и в бюджет view не входят.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WARN, RAISE, OFF = 'warn', 'raise', 'off'
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+_outside_budget = ContextVar('outside_budget', default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Объявляем, сколько SQL-запросов может сделать view."""
+    def decorator(view_func):
+        # Атрибут переживает login_required и другие обёртки с wraps.
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+@contextmanager
+def outside_budget():
+    """Запросы блока не входят в бюджет view."""
+    token = _outside_budget.set(True)
+    try:
+        yield
+    finally:
+        _outside_budget.reset(token)
+
+
+def shape(sql):
+    """SQL без параметров; списки IN (...) любой длины совпадают."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryStats:
+    """Запросы одного HTTP-запроса; подключается через execute_wrapper."""
+
+    def __init__(self, view_name=None, budget=None):
+        self.view_name = view_name
+        self.budget = budget
+        self.count = 0
+        self.outside = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            if _outside_budget.get():
+                self.outside += 1
+            else:
+                self.count += 1
+                self.shapes[shape(sql)] += 1
+
+    def record(self):
+        """Включаем учёт на всех подключениях к базам."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.shapes.items() if count > 1}
+
+    @property
+    def exceeded(self):
+        return self.budget is not None and self.count > self.budget
+
+    def report(self):
+        outside = f' + {self.outside} вне бюджета' if self.outside else ''
+        lines = [
+            f'{self.view_name}: {self.count} запросов '
+            f'(бюджет {self.budget}){outside}, '
+            f'{self.duration * 1000:.1f} мс'
+        ]
+        lines += [
+            f'  {count} × {sql}' for sql, count in self.duplicates.items()]
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы каждого HTTP-запроса и проверяет бюджет view.
+
+    Статистика остаётся в request.query_stats: её читают тесты.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', WARN)
+        if mode == OFF:
+            return self.get_response(request)
+        stats = request.query_stats = QueryStats()
+        with stats.record():
+            response = self.get_response(request)
+        match = request.resolver_match
+        stats.view_name = match.view_name if match else request.path
+        logger.debug('%s', stats.report())
+        if stats.exceeded:
+            if mode == RAISE:
+                raise QueryBudgetExceeded(stats.report())
+            logger.warning('Превышен бюджет запросов\n%s', stats.report())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            stats.budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,138 @@
+"""Ограничение частоты записи и сброс нагрузки для пишущих view.
+
+@write_limit(name, rate) вешается на view поверх остальных
+декораторов и делает две вещи.
+
+Сброс нагрузки. Процесс считает, сколько пишущих запросов сейчас
+выполняется (очередь к блокировке SQLite), и скользящее среднее их
+длительности. Если очередь длиннее WRITE_SHED_QUEUE или среднее
+больше WRITE_SHED_LATENCY секунд, запрос получает 429 сразу: без
+сессии, пользователя, ORM и шаблонов. Среднее со временем затухает,
+чтобы после паузы запись снова пошла. Читающие view это не трогает.
+
+Ограничение частоты. Токены лежат в кэше, ведро на каждого
+пользователя (анонима — по IP) и view: rate вида «10/m» задаёт
+и скорость пополнения, и ёмкость ведра. Частоты переопределяются
+настройкой RATE_LIMITS ({name: rate}, None — без ограничения).
+Ведро читается и пишется без блокировки, поэтому при одновременных
+запросах одного клиента лимит приблизительный.
+"""
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+KEY_PREFIX = 'ratelimit'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# Вес нового замера в скользящем среднем и период полураспада среднего.
+LATENCY_WEIGHT = 0.2
+LATENCY_HALF_LIFE = 5.0
+
+
+def parse_rate(rate):
+    """«10/m» -> (ёмкость ведра, токенов в секунду)."""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period]
+
+
+def client_id(request, key):
+    if key == 'user' and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def take_token(bucket, rate, now=None):
+    """Берём токен из ведра.
+
+    Возвращаем 0 или, если токенов нет, сколько секунд ждать следующего.
+    """
+    capacity, refill = parse_rate(rate)
+    now = time.time() if now is None else now
+    key = f'{KEY_PREFIX}:{bucket}'
+    tokens, stamp = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * refill)
+    wait = 0 if tokens >= 1 else (1 - tokens) / refill
+    if not wait:
+        tokens -= 1
+    # Полное ведро хранить незачем: его и так вернёт отсутствие ключа.
+    cache.set(key, (tokens, now), math.ceil(capacity / refill))
+    return wait
+
+
+class WriteLoad:
+    """Пишущие запросы процесса: сколько идёт сейчас и как долго."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.average = 0.0
+        self.measured = 0.0
+
+    def latency(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.average * 0.5 ** (
+            (now - self.measured) / LATENCY_HALF_LIFE)
+
+    def overloaded(self):
+        return (
+            self.in_flight >= getattr(settings, 'WRITE_SHED_QUEUE', 8)
+            or self.latency() >= getattr(settings, 'WRITE_SHED_LATENCY', 2.0)
+        )
+
+    @contextmanager
+    def track(self):
+        start = time.monotonic()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            with self.lock:
+                self.in_flight -= 1
+                self.average = self.latency(now) + LATENCY_WEIGHT * (
+                    now - start - self.latency(now))
+                self.measured = now
+
+
+write_load = WriteLoad()
+
+
+def too_many_requests(message, retry_after):
+    response = HttpResponse(
+        message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def write_limit(name, rate, key='user', methods=None):
+    """Ограничиваем частоту view и сбрасываем нагрузку на запись.
+
+    key — 'user' (анонимы по IP) или 'ip'; methods — методы, которые
+    пишут (None — все: подписка, например, идёт через GET).
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if methods is not None and request.method not in methods:
+                return view_func(request, *args, **kwargs)
+            if write_load.overloaded():
+                return too_many_requests(
+                    'Сервер перегружен, попробуйте позже.',
+                    LATENCY_HALF_LIFE)
+            view_rate = getattr(settings, 'RATE_LIMITS', {}).get(name, rate)
+            if view_rate is not None:
+                wait = take_token(
+                    f'{name}:{client_id(request, key)}', view_rate)
+                if wait:
+                    return too_many_requests(
+                        'Слишком много запросов, попробуйте позже.', wait)
+            with write_load.track():
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+"""Чтение с реплик базы и «липкий» primary после записи.
+
+View, которые только читают, помечаются декоратором @replica_reads.
+ReplicaMiddleware выбирает для такого запроса одну из реплик
+(DATABASE_REPLICAS), и ReplicaRouter отправляет туда все чтения.
+Запись и все остальные view всегда идут в default.
+
+Реплика отстаёт от primary, поэтому после запроса, который что-то
+записал в базу (роутер отмечает каждую запись), клиент получает cookie
+и ещё REPLICA_STICKY_SECONDS читает из primary: свой новый пост,
+комментарий или подписку пользователь видит сразу.
+
+Поколения кэша сдвигает запись в primary, и отстающая реплика отдала
+бы старые строки под новым поколением. Поэтому запрос, читающий
+с реплики (reading_replica), кэш только читает: фрагменты, карточки,
+страницы и ETag в нём не сохраняются и не отдаются.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_read_database = ContextVar('read_database', default=None)
+# Список, в который роутер отмечает записи текущего запроса.
+_writes = ContextVar('writes', default=None)
+
+
+def replica_reads(view_func):
+    """Разрешаем view читать с реплики."""
+    # Атрибут переживает login_required и другие обёртки с wraps.
+    view_func.replica_reads = True
+    return view_func
+
+
+def reading_replica():
+    """Читает ли текущий запрос с реплики."""
+    return _read_database.get() not in (None, PRIMARY)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+class ReplicaRouter:
+    """Чтения запроса — в выбранную middleware базу, запись — в primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.append(model)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии primary: объекты из разных баз связываемы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приезжает вместе с данными (sync_replica).
+        return db not in get_replicas()
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def is_sticky(request):
+        try:
+            return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def __call__(self, request):
+        request.read_database = PRIMARY
+        writes = []
+        read_token = _read_database.set(None)
+        writes_token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_database.reset(read_token)
+            _writes.reset(writes_token)
+        if writes and response.status_code < 400:
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = get_replicas()
+        if (
+            replicas
+            and request.method in SAFE_METHODS
+            and getattr(view_func, 'replica_reads', False)
+            and not self.is_sticky(request)
+        ):
+            request.read_database = random.choice(replicas)
+            _read_database.set(request.read_database)
@@ -0,0 +1,122 @@
+"""Боевой режим SQLite: WAL, прагмы подключений и повтор записи.
+
+В режиме WAL читатели не ждут писателя, но писатель в базе по-прежнему
+один. Прагмы (SQLITE_PRAGMAS) выполняются на каждом новом подключении
+сигналом connection_created, когда включён SQLITE_PRODUCTION.
+busy_timeout заставляет SQLite ждать блокировку сам; если она так и не
+освободилась, @retry_on_locked повторяет view целиком с растущей
+паузой, а write_with_retry — только переданную функцию записи (когда
+до записи идёт долгая работа, которую не стоит делать под блокировкой).
+Контрольные точки WAL и статистику планировщика обновляет команда
+sqlite_maintenance.
+"""
+import functools
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'wal',
+    # В WAL NORMAL не портит базу при сбое, теряются лишь последние
+    # транзакции до контрольной точки.
+    'synchronous': 'normal',
+    'mmap_size': 256 * 2 ** 20,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 2 ** 10,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+LOCK_RETRIES = 4
+LOCK_BACKOFF = 0.05
+
+
+def get_pragmas():
+    if not getattr(settings, 'SQLITE_PRODUCTION', False):
+        return {}
+    return getattr(settings, 'SQLITE_PRAGMAS', PRODUCTION_PRAGMAS)
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+@contextmanager
+def write_transaction():
+    """transaction.atomic, которая сразу берёт блокировку на запись.
+
+    Отложенная транзакция, которая сначала читала, в WAL не может
+    дождаться записи: SQLite сразу отвечает «database is locked»,
+    и busy_timeout не помогает. Поэтому внешняя транзакция в SQLite
+    начинается с BEGIN IMMEDIATE и ждёт своей очереди (в Django 2.2
+    нет настройки transaction_mode, меняем BEGIN у подключения потока).
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection._start_transaction_under_autocommit = (
+        lambda: connection.cursor().execute('BEGIN IMMEDIATE'))
+    try:
+        with transaction.atomic():
+            yield
+    finally:
+        del connection._start_transaction_under_autocommit
+
+
+def write_with_retry(func, *args, **kwargs):
+    """Выполняем func в write_transaction, повторяя её при блокировке.
+
+    Каждая попытка откатывается целиком. Если транзакция уже
+    зафиксирована (упал обработчик on_commit) или вызов идёт внутри
+    чужой транзакции, повторять нельзя.
+    """
+    if connection.in_atomic_block:
+        return func(*args, **kwargs)
+    for attempt in range(LOCK_RETRIES + 1):
+        committed = []
+        try:
+            with write_transaction():
+                transaction.on_commit(lambda: committed.append(True))
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_locked(error) or committed or attempt == LOCK_RETRIES:
+                raise
+            delay = LOCK_BACKOFF * 2 ** attempt
+            logger.warning(
+                'База занята, повтор %s через %.2f с: %s',
+                attempt + 1, delay, func.__qualname__)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+
+def retry_on_locked(view_func=None, methods=None):
+    """Повторяем view, если SQLite не дождалась блокировки на запись.
+
+    Весь view идёт в write_with_retry. methods — методы, которые пишут
+    (None — все), как у write_limit: остальные, например GET формы, идут
+    без транзакции и не держат блокировку на запись, пока рисуется
+    шаблон.
+    """
+    if view_func is None:
+        return functools.partial(retry_on_locked, methods=methods)
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if methods is not None and request.method not in methods:
+            return view_func(request, *args, **kwargs)
+        return write_with_retry(view_func, request, *args, **kwargs)
+    return wrapper
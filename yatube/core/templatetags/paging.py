@@ -0,0 +1,14 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, **params):
+    """Ссылка на соседнюю страницу с сохранением остальных параметров."""
+    query = context['request'].GET.copy()
+    for name in ('after', 'before', 'page'):
+        query.pop(name, None)
+    for name, value in params.items():
+        query[name] = value
+    return f'?{query.urlencode()}' if query else context['request'].path
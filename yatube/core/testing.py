@@ -0,0 +1,25 @@
+"""Помощники для тестов."""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from .queries import RAISE
+
+
+class TestRunner(DiscoverRunner):
+    """В тестах превышение бюджета запросов роняет запрос."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_MODE = RAISE
+
+
+class QueryBudgetMixin:
+    """Проверка числа запросов view по статистике QueryBudgetMiddleware."""
+
+    def assertQueryCount(self, response, expected):
+        """View сделал ровно expected запросов и уложился в свой бюджет."""
+        stats = response.wsgi_request.query_stats
+        self.assertEqual(stats.count, expected, stats.report())
+        self.assertIsNotNone(
+            stats.budget, f'{stats.view_name}: бюджет не объявлен')
+        self.assertLessEqual(stats.count, stats.budget, stats.report())
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше MAX_UPLOAD_SIZE байт.
+
+    Остаток слишком большого файла читается из запроса и выбрасывается,
+    а у файла ставится признак truncated: отклонить его должна форма,
+    тогда пользователь увидит ошибку рядом с полем, а не обрыв соединения.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.file.truncated = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            self.file.truncated = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
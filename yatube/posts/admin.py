@@ -1,14 +1,55 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import (
+    ALL_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR)
 
+from . import cache
 from .models import Comment, Follow, Group, Post
+from .paginators import CachedCountPaginator
+
+# Параметры списка, которые не меняют число строк.
+DISPLAY_VARS = {ALL_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR}
+# Фильтр списка -> область, в которой кэшируется число постов.
+COUNT_SCOPES = {
+    'group__id__exact': cache.group_scope,
+    'author__id__exact': cache.author_scope,
+}
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', 'group',)
     empty_value_display = '-пусто-'
+    paginator = CachedCountPaginator
+    # Иначе при любом фильтре считается ещё и вся таблица.
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            scope=self.count_scope(request))
+
+    @staticmethod
+    def count_scope(request):
+        """Область для кэша числа постов в списке или None.
+
+        Кэшируется только список без фильтров или с одним фильтром
+        по группе или автору.
+        """
+        filters = {
+            name: value for name, value in request.GET.items()
+            if name not in DISPLAY_VARS
+        }
+        if not filters:
+            return cache.GLOBAL_SCOPE
+        if len(filters) != 1:
+            return None
+        [(name, value)] = filters.items()
+        if name not in COUNT_SCOPES or not value.isdigit():
+            return None
+        return COUNT_SCOPES[name](int(value))
 
 
 class GroupAdmin(admin.ModelAdmin):
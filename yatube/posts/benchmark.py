@@ -0,0 +1,178 @@
+"""Замеры задержки, числа запросов и памяти для всех страниц posts.
+
+Каждый маршрут из posts/urls.py прогоняется через тестовый клиент Django:
+сначала несколько прогревочных запросов, затем серия замеров, по которой
+считаются перцентили. Память (пик выделений tracemalloc) меряется
+отдельной короткой серией: под tracemalloc код заметно медленнее, и он
+испортил бы задержки. Результаты сохраняются в JSON, два прогона можно
+сравнить.
+"""
+import datetime
+import math
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from core.queries import QueryStats
+
+from . import urls
+from .models import Group, Post, User
+
+# Маршруты, которые меняют данные: замеры не должны портить базу.
+WRITE_ROUTES = {'add_comment', 'profile_follow', 'profile_unfollow'}
+# Долгий опрос держит запрос до таймаута: задержку мерить бессмысленно.
+LONG_POLL_ROUTES = {'live_posts'}
+
+
+def percentile(values, share):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Benchmark:
+    def __init__(self, requests=50, warmup=5, memory_samples=5, cold=False,
+                 username=None, routes=None):
+        self.requests = requests
+        self.warmup = warmup
+        self.memory_samples = memory_samples
+        self.cold = cold
+        self.user = (
+            User.objects.get(username=username) if username else None)
+        self.routes = routes
+
+    def samples(self):
+        """Самые тяжёлые объекты каждого вида: худший случай страниц."""
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        author = User.objects.order_by('-stats__posts_count', '-pk').first()
+        group = Group.objects.order_by('-posts_count', '-pk').first()
+        word = post.text.split()[0] if post and post.text else 'пост'
+        own_post = (
+            Post.objects.filter(author=self.user).first()
+            if self.user else None)
+        return {
+            'post_id': post and post.pk,
+            'username': author and author.username,
+            'slug': group and group.slug,
+            'own_post_id': own_post and own_post.pk,
+            'query': word,
+        }
+
+    def targets(self):
+        """Пары (имя, url) для всех маршрутов posts, кроме пишущих."""
+        samples = self.samples()
+        targets = []
+        for pattern in urls.urlpatterns:
+            name = pattern.name
+            if name in WRITE_ROUTES | LONG_POLL_ROUTES:
+                continue
+            if self.routes and not any(part in name for part in self.routes):
+                continue
+            kwargs = {}
+            for argument in pattern.pattern.converters:
+                value = samples[argument]
+                if name == 'post_edit':
+                    value = samples['own_post_id']
+                kwargs[argument] = value
+            if None in kwargs.values():
+                continue
+            url = reverse(f'{urls.app_name}:{name}', kwargs=kwargs)
+            if name == 'search':
+                url += f'?q={samples["query"]}'
+            targets.append((name, url))
+        return targets
+
+    def request(self, client, url):
+        if self.cold:
+            cache.clear()
+        stats = QueryStats()
+        start = time.perf_counter()
+        with stats.record():
+            response = client.get(url)
+        return response, time.perf_counter() - start, stats.count
+
+    def measure(self, client, url):
+        for _ in range(self.warmup):
+            self.request(client, url)
+        timings, queries = [], []
+        for _ in range(self.requests):
+            response, elapsed, count = self.request(client, url)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+        peaks = []
+        for _ in range(self.memory_samples):
+            # Перезапуск обнуляет пик: reset_peak() есть только с 3.9.
+            tracemalloc.start()
+            try:
+                self.request(client, url)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': percentile(queries, 0.50),
+            'max_queries': max(queries),
+            'peak_memory_kib': (
+                round(percentile(peaks, 0.50) / 1024, 1) if peaks else None),
+        }
+
+    def clients(self):
+        clients = {'guest': Client()}
+        if self.user is not None:
+            clients['user'] = Client()
+            clients['user'].force_login(self.user)
+        return clients
+
+    def run(self, log=None):
+        log = log or (lambda message: None)
+        results = {}
+        targets = self.targets()
+        for client_name, client in self.clients().items():
+            for name, url in targets:
+                key = f'{client_name}:{name}'
+                results[key] = self.measure(client, url)
+                log(f'{key}: p50 {results[key]["p50_ms"]} мс')
+        return {
+            'meta': {
+                'created': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'posts': Post.objects.count(),
+                'requests': self.requests,
+                'warmup': self.warmup,
+                'cold_cache': self.cold,
+            },
+            'results': results,
+        }
+
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_memory_kib')
+
+
+def compare(baseline, current):
+    """Строки сравнения двух прогонов: (маршрут, метрика, было, стало, %)."""
+    rows = []
+    for key, result in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            continue
+        for metric in COMPARED:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else None
+            rows.append((key, metric, old, new, change))
+    return rows
@@ -0,0 +1,73 @@
+"""Области инвалидации кэша лент постов.
+
+Фрагменты лент кэшируются надолго (FEED_CACHE_TIMEOUT), а в ключ
+входит поколение области: изменение поста сразу делает устаревшими
+главную, ленту его группы, профиль автора и ленты подписчиков.
+Те же области служат тегами страниц в кэше для анонимов.
+"""
+import hashlib
+
+from django.conf import settings
+
+from core import generations
+from core.replicas import reading_replica
+
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+
+GLOBAL_SCOPE = 'posts'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follower_scope(user_id):
+    return f'follower:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def feed_timeout():
+    """Срок фрагментов ленты; 0 — не сохранять (чтение с реплики)."""
+    return 0 if reading_replica() else FEED_CACHE_TIMEOUT
+
+
+def feed_version(*scopes):
+    return generations.version(*scopes)
+
+
+def follow_feed_version(user_id, author_ids):
+    """Лента подписок зависит от набора подписок и от самих авторов."""
+    return generations.version(
+        follower_scope(user_id), *map(author_scope, sorted(author_ids)))
+
+
+def page_etag(request, *scopes):
+    """ETag страницы: поколения её областей и текущий пользователь.
+
+    От пользователя зависят шапка, формы и кнопки, поэтому гость
+    и каждый пользователь получают свой тег. Странице с реплики тег
+    не положен: её данные могут быть старше поколений.
+    """
+    if reading_replica():
+        return None
+    versions = generations.get_versions(*scopes)
+    raw = ':'.join([
+        str(request.user.pk or 0),
+        *(f'{scope}={versions[scope]}' for scope in scopes),
+    ])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def post_changed(post, *group_ids):
+    """Пост создан, изменён или удалён."""
+    scopes = [
+        GLOBAL_SCOPE, author_scope(post.author_id), post_scope(post.pk)]
+    scopes += [group_scope(pk) for pk in {post.group_id, *group_ids} if pk]
+    generations.bump_on_commit(*scopes)
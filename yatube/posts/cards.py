@@ -0,0 +1,53 @@
+"""Кэш отрисованных карточек постов, общий для всех лент.
+
+Карточка — HTML одного поста в ленте, её вариант задаётся шаблоном
+(с автором или без, со ссылкой на группу или без). В ключ входят
+id поста, шаблон и Post.updated: сохранение поста даёт новый ключ,
+а старая запись вытесняется сама. Группа и имя автора тоже видны
+в карточке, поэтому при их изменении updated постов сдвигается
+(touch из сигналов), как и при готовности миниатюр.
+
+Карточки страницы читаются одним get_many, недостающие рисуются
+и кладутся одним set_many; лента собирается из готовых строк.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core.replicas import reading_replica
+
+CARD_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+KEY_PREFIX = 'card'
+
+
+def card_key(post, template_name):
+    return (
+        f'{KEY_PREFIX}:{template_name}:{post.pk}:'
+        f'{post.updated.timestamp():.6f}'
+    )
+
+
+def render_cards(posts, template_name):
+    """HTML карточек постов в порядке posts."""
+    posts = list(posts)
+    keys = [card_key(post, template_name) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    template = None
+    for key, post in zip(keys, posts):
+        if key in cards or key in missing:
+            continue
+        template = template or get_template(template_name)
+        missing[key] = template.render({'post': post})
+    if missing:
+        if not reading_replica():
+            cache.set_many(missing, CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def touch(queryset):
+    """Устаревают закэшированные карточки постов queryset."""
+    return queryset.update(updated=timezone.now())
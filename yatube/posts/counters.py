@@ -0,0 +1,114 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются F-выражениями из сигналов моделей, то есть в той же
+транзакции, что и создание/удаление строки. bulk_create и прямые
+update() сигналы обходят — расхождения исправляет команда
+reconcile_counters.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+STATS_FIELDS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def bump(queryset, field, delta):
+    if delta < 0:
+        # Не уходим в минус, если счётчик уже разошёлся с данными.
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_stats(user_id, field, delta):
+    """Меняем счётчик пользователя; строку создаём с честными значениями."""
+    if bump(AuthorStats.objects.filter(user_id=user_id), field, delta):
+        return
+    # При удалении строку не создаём: пользователь может удаляться сам.
+    if delta > 0:
+        AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults=count_stats(user_id))
+
+
+def count_stats(user_id):
+    return {
+        field: model.objects.filter(**{relation: user_id}).count()
+        for field, (model, relation) in STATS_FIELDS.items()
+    }
+
+
+def count_subquery(model, relation):
+    """Количество строк model, ссылающихся на внешнюю строку."""
+    counts = (
+        model.objects.filter(**{relation: OuterRef('pk')})
+        .order_by().values(relation)
+        .annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def _batches(queryset, batch_size):
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def reconcile_model(model, counters, batch_size):
+    """Пересчитываем счётчики model пачками, пишем только расхождения."""
+    annotations = {
+        f'actual_{field}': count_subquery(*source)
+        for field, source in counters.items()
+    }
+    fixed = 0
+    queryset = model.objects.annotate(**annotations)
+    for batch in _batches(queryset, batch_size):
+        changed = []
+        for obj in batch:
+            drift = False
+            for field in counters:
+                actual = getattr(obj, f'actual_{field}')
+                if getattr(obj, field) != actual:
+                    setattr(obj, field, actual)
+                    drift = True
+            if drift:
+                changed.append(obj)
+        model.objects.bulk_update(changed, list(counters))
+        fixed += len(changed)
+    return fixed
+
+
+def create_missing_stats(batch_size):
+    """Заводим строки счётчиков для пользователей, у которых их нет."""
+    created = 0
+    users = User.objects.filter(stats__isnull=True).only('pk')
+    for batch in _batches(users, batch_size):
+        AuthorStats.objects.bulk_create(
+            AuthorStats(user=user) for user in batch)
+        created += len(batch)
+    return created
+
+
+def reconcile(batch_size=1000):
+    """Исправляем дрейф всех счётчиков, возвращаем число правок."""
+    return {
+        'stats_created': create_missing_stats(batch_size),
+        'authors': reconcile_model(AuthorStats, {
+            field: (model, f'{relation}_id')
+            for field, (model, relation) in STATS_FIELDS.items()
+        }, batch_size),
+        'posts': reconcile_model(
+            Post, {'comments_count': (Comment, 'post')}, batch_size),
+        'groups': reconcile_model(
+            Group, {'posts_count': (Post, 'group')}, batch_size),
+    }
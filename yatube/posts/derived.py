@@ -0,0 +1,35 @@
+"""Пересборка данных, которые обычно поддерживают сигналы.
+
+Нужна после заливки строк мимо сигналов (bulk_create): генератора
+данных (seeding.py) и импорта (transfer.py). Модуль не тянет
+зависимостей генератора (Faker, mixer), поэтому импорт работает
+и без них.
+"""
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from . import counters, search, timeline
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключаем auto_now_add, чтобы записать даты из прошлого."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def rebuild_derived(batch_size, log):
+    """Пересобираем всё, что обычно поддерживают сигналы."""
+    fixed = counters.reconcile(batch_size=batch_size)
+    log(f'счётчики: {fixed}')
+    log(f'ленты подписок: {timeline.rebuild()}')
+    log(f'поисковый индекс: {search.rebuild(batch_size)}')
+    # Кэш лент и страниц ничего не знает о залитых данных.
+    cache.clear()
@@ -1,12 +1,61 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
 
+from . import images
 from .models import Comment, Post
 
 
+class PostImageField(forms.ImageField):
+    """Картинка с ограничениями размера, которая сохраняется нормализованной.
+
+    Объём проверяется до чтения картинки, число кадров и пикселей —
+    по заголовку до её декодирования.
+    """
+
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s МБ.',
+        'too_many_pixels': 'Картинка больше %(limit)s мегапикселей.',
+        'too_many_frames': 'В анимации больше %(limit)s кадров.',
+        'broken': 'Не удалось обработать картинку.',
+    }
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        if (
+            getattr(data, 'truncated', False)
+            or data.size > settings.MAX_UPLOAD_SIZE
+        ):
+            raise ValidationError(
+                self.error_messages['too_large'], code='too_large',
+                params={'limit': settings.MAX_UPLOAD_SIZE // 2 ** 20})
+        file_ = super().to_python(data)
+        header = images.open_header(file_)
+        if images.too_many_frames(header):
+            raise ValidationError(
+                self.error_messages['too_many_frames'],
+                code='too_many_frames',
+                params={'limit': settings.MAX_IMAGE_FRAMES})
+        if images.too_many_pixels(header):
+            raise ValidationError(
+                self.error_messages['too_many_pixels'],
+                code='too_many_pixels',
+                params={'limit': settings.MAX_IMAGE_PIXELS // 10 ** 6})
+        try:
+            return images.normalize(file_)
+        except (OSError, ValueError, SyntaxError) as exc:
+            # Pillow открыл файл, но не смог его декодировать, разобрать
+            # EXIF (images.BrokenImage) или записать.
+            raise ValidationError(
+                self.error_messages['broken'], code='broken') from exc
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
         labels = {
             'text': "Текст поста",
             'group': "Группа",
@@ -16,6 +65,16 @@ class PostForm(forms.ModelForm):
             'group': "Группа, к которой будет относиться пост",
         }
 
+    def save_image(self):
+        """Кладём новую картинку в хранилище до транзакции записи.
+
+        Иначе её сохраняет post.save(), и повтор транзакции после
+        «database is locked» записал бы файл ещё раз под новым именем.
+        """
+        image = self.instance.image
+        if image and not image._committed:
+            image.save(image.name, image.file, save=False)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,59 @@
+"""Кэш подписок пользователя: отсортированный массив id авторов.
+
+Массив (array('q'), 8 байт на подписку) читается из базы один раз
+и хранится в кэше байтами. Проверка «подписан ли» — двоичный поиск
+в памяти, поэтому кнопка подписки в профиле не стоит ни одного запроса.
+
+В ключ массива входит поколение follower_scope подписчика, которое
+сигналы Follow сдвигают при каждой подписке и отписке. Массив не
+правится на месте: сдвиг поколения атомарен и виден всем процессам
+с общим кэшем, а чтение-правка-запись массива теряла бы параллельные
+правки. Устаревший массив перечитывается при следующем обращении.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from core import generations
+from core.replicas import reading_replica
+
+from .cache import follower_scope
+from .models import Follow
+
+KEY_PREFIX = 'following'
+TIMEOUT = 60 * 60 * 24
+TYPECODE = 'q'
+
+
+def _key(user_id):
+    version = generations.version(follower_scope(user_id))
+    return f'{KEY_PREFIX}:{user_id}:{version}'
+
+
+def followed_ids(user_id):
+    """Отсортированные id авторов, на которых подписан пользователь."""
+    key = _key(user_id)
+    raw = cache.get(key)
+    ids = array(TYPECODE)
+    if raw is not None:
+        ids.frombytes(raw)
+        return ids
+    ids.extend(Follow.objects.filter(
+        user_id=user_id).order_by('author_id').values_list(
+        'author_id', flat=True))
+    # С реплики массив может быть старым: не сохраняем его.
+    if not reading_replica():
+        cache.set(key, ids.tobytes(), TIMEOUT)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = followed_ids(user_id)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def forget(user_id):
+    """Кэш отстал от базы: сдвигаем поколение, массив перечитается."""
+    generations.bump(follower_scope(user_id))
@@ -0,0 +1,144 @@
+"""Нормализация загруженных картинок постов.
+
+Сохраняется не оригинал, а перекодированная копия: повёрнутая по EXIF,
+уменьшенная до MAX_IMAGE_DIMENSION по большей стороне и без метаданных.
+Анимация перекодируется покадрово. Число кадров (не больше
+MAX_IMAGE_FRAMES) и пикселей во всех кадрах проверяется по заголовку,
+до декодирования картинки.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps, ImageSequence
+
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {'optimize': True},
+    'WEBP': {'quality': 85, 'method': 6},
+}
+# Остальные форматы (BMP, TIFF...) сохраняем в PNG.
+FALLBACK_FORMAT = 'PNG'
+# Режимы, которые форматы умеют записать; остальные (CMYK, YCbCr...)
+# переводим в RGB или, если есть прозрачность, в RGBA.
+SAVE_MODES = {
+    'JPEG': ('RGB', 'L'),
+    'PNG': ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I'),
+}
+
+
+# Что из image.info нужно для записи; остальное (комментарии, XMP...) —
+# метаданные, которые Pillow иначе записал бы в копию.
+KEPT_INFO = ('transparency',)
+# Форматы, которые умеют записать анимацию; остальные анимации
+# сохраняем в GIF.
+ANIMATED_FORMATS = ('GIF', 'WEBP')
+ANIMATED_FALLBACK_FORMAT = 'GIF'
+
+
+class BrokenImage(ValueError):
+    """Pillow открыл картинку, но не смог разобрать её метаданные."""
+
+
+def open_header(file_):
+    """Картинка из file_ без декодирования: хватает для размеров и кадров.
+
+    Картинка, которую оставляет ImageField, после verify() уже не умеет
+    перебирать кадры, поэтому открываем файл заново.
+    """
+    file_.seek(0)
+    return Image.open(file_)
+
+
+def frame_count(image):
+    return getattr(image, 'n_frames', 1)
+
+
+def too_many_frames(image):
+    return frame_count(image) > settings.MAX_IMAGE_FRAMES
+
+
+def too_many_pixels(image):
+    width, height = image.size
+    return width * height * frame_count(image) > settings.MAX_IMAGE_PIXELS
+
+
+def transpose(image):
+    """Поворачиваем картинку по EXIF."""
+    try:
+        return ImageOps.exif_transpose(image)
+    except Exception as exc:
+        # Разбор чужого EXIF падает чем угодно: struct.error, KeyError,
+        # TypeError... Для формы это одна ошибка — битая картинка.
+        raise BrokenImage('Не удалось прочитать EXIF') from exc
+
+
+def fit(image, format_):
+    """Уменьшаем кадр и переводим в режим, который format_ запишет."""
+    max_size = settings.MAX_IMAGE_DIMENSION
+    image.thumbnail((max_size, max_size), LANCZOS)
+    if image.mode not in SAVE_MODES.get(format_, (image.mode,)):
+        transparent = 'A' in image.mode or 'transparency' in image.info
+        image = image.convert(
+            'RGBA' if transparent and format_ != 'JPEG' else 'RGB')
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEPT_INFO}
+    return image
+
+
+def animation(image, format_):
+    """Первый кадр анимации и опции, с которыми пишутся остальные."""
+    durations = []
+    frames = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        # Кадры GIF бывают частичными; convert отдаёт собранный кадр.
+        frames.append(fit(transpose(frame.convert('RGBA')), format_))
+    options = {
+        'save_all': True,
+        'append_images': frames[1:],
+        'duration': durations,
+        'loop': image.info.get('loop', 0),
+    }
+    if format_ == 'GIF':
+        # Каждый кадр целиком заменяет предыдущий.
+        options['disposal'] = 2
+    return frames[0], options
+
+
+def normalize(file_):
+    """Перекодированная копия картинки из file_ для сохранения."""
+    file_.seek(0)
+    image = Image.open(file_)
+    source_format = image.format
+    animated = getattr(image, 'is_animated', False)
+    supported = ANIMATED_FORMATS if animated else SAVE_OPTIONS
+    format_ = source_format if source_format in supported else (
+        ANIMATED_FALLBACK_FORMAT if animated else FALLBACK_FORMAT)
+    icc_profile = image.info.get('icc_profile')
+    options = dict(SAVE_OPTIONS[format_])
+    if animated:
+        image, frame_options = animation(image, format_)
+        options.update(frame_options)
+    else:
+        if source_format == 'JPEG':
+            # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+            max_size = settings.MAX_IMAGE_DIMENSION
+            image.draft('RGB', (max_size, max_size))
+        image = fit(transpose(image), format_)
+    name = os.path.basename(file_.name)
+    if format_ != source_format:
+        name = f'{os.path.splitext(name)[0]}.{format_.lower()}'
+    if icc_profile and format_ != 'GIF':
+        options['icc_profile'] = icc_profile
+    # Небольшой результат остаётся в памяти, большой уходит на диск.
+    buffer = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    # EXIF и прочие метаданные убраны из info в fit().
+    image.save(buffer, format_, **options)
+    buffer.seek(0)
+    return File(buffer, name=name)
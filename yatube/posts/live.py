@@ -0,0 +1,112 @@
+"""Долгий опрос «новые посты после id» для живых лент.
+
+Клиент присылает id самого нового поста, который у него уже есть.
+Если в ленте есть посты новее, ответ приходит сразу; иначе запрос
+ждёт на threading.Condition, пока сигнал сохранения поста не разбудит
+ожидающих, или до таймаута. База проверяется только при пробуждении
+подходящим событием, а не по таймеру.
+
+Уведомления живут в памяти процесса. Пост, сохранённый в другом
+процессе, клиент увидит со следующим опросом: тот начинается
+с проверки базы.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+
+from .graph import followed_ids
+from .models import Group, Post, User
+
+TIMEOUT = 25
+EVENTS_KEPT = 1000
+
+Event = namedtuple('Event', 'sequence post_id author_id group_id')
+
+
+class Notifier:
+    """Последние события «создан пост» и ожидающие их потоки."""
+
+    def __init__(self, size=EVENTS_KEPT):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.events = deque(maxlen=size)
+
+    def publish(self, post):
+        with self.condition:
+            self.sequence += 1
+            self.events.append(Event(
+                self.sequence, post.pk, post.author_id, post.group_id))
+            self.condition.notify_all()
+
+    def _matched(self, after, matches):
+        if self.events and self.events[0].sequence > after + 1:
+            # Часть событий вытеснена: пусть проверит база.
+            return True
+        return any(
+            event.sequence > after and matches(event)
+            for event in self.events)
+
+    def wait(self, after, matches, timeout):
+        """Ждём события новее after, подходящего под matches.
+
+        Возвращаем номер последнего события или None по таймауту.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self._matched(after, matches):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return self.sequence
+
+
+notifier = Notifier()
+
+
+def resolve_feed(feed, key, user):
+    """Посты ленты и проверка, касается ли её событие."""
+    if feed == 'group':
+        group = get_object_or_404(Group, slug=key)
+        return (
+            Post.objects.filter(group=group),
+            lambda event: event.group_id == group.pk)
+    if feed == 'profile':
+        author = get_object_or_404(User, username=key)
+        return (
+            Post.objects.filter(author=author),
+            lambda event: event.author_id == author.pk)
+    if feed == 'follow':
+        if not user.is_authenticated:
+            raise PermissionDenied
+        author_ids = set(followed_ids(user.pk))
+        return (
+            Post.objects.filter(author_id__in=author_ids),
+            lambda event: event.author_id in author_ids)
+    return Post.objects.all(), lambda event: True
+
+
+def wait_for_posts(queryset, matches, since, timeout, limit):
+    """Число постов новее since и первые limit из них.
+
+    Если таких постов нет, ждём их не дольше timeout секунд.
+    """
+    queryset = queryset.filter(pk__gt=since)
+    page = queryset.select_related('author', 'group').order_by(
+        '-pub_date', '-id')[:limit]
+    deadline = time.monotonic() + timeout
+    # Номер события берём до запроса: пост, созданный между ними,
+    # разбудит нас сразу.
+    sequence = notifier.sequence
+    posts = list(page.all())
+    while not posts:
+        sequence = notifier.wait(
+            sequence, matches, deadline - time.monotonic())
+        if sequence is None:
+            break
+        posts = list(page.all())
+    count = queryset.count() if len(posts) == limit else len(posts)
+    return count, posts
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from posts.benchmark import Benchmark, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Меряет задержку (p50/p95/p99), число SQL-запросов и память '
+        'для всех страниц posts и сохраняет результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько замеров делать для каждой страницы.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--memory-samples', type=int, default=5,
+            help='Сколько запросов мерить под tracemalloc.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Чистить кэш перед каждым запросом.')
+        parser.add_argument(
+            '--user', help='Дополнительно мерить страницы от этого юзера.')
+        parser.add_argument(
+            '--routes', nargs='*',
+            help='Мерить только маршруты, в имени которых есть эти строки.')
+        parser.add_argument('--output', help='Куда сохранить JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        benchmark = Benchmark(
+            requests=options['requests'],
+            warmup=options['warmup'],
+            memory_samples=options['memory_samples'],
+            cold=options['cold'],
+            username=options['user'],
+            routes=options['routes'],
+        )
+        # DEBUG копит все запросы в памяти, а бюджеты считаем сами.
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'],
+            QUERY_BUDGET_MODE='off',
+        ):
+            report = benchmark.run(log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                rows = compare(json.load(baseline), report)
+            for key, metric, old, new, change in rows:
+                delta = f'{change:+.1f}%' if change is not None else '—'
+                self.stdout.write(
+                    f'{key:<28} {metric:<16} {old:>10} → {new:<10} {delta}')
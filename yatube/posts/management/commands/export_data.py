@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import BATCH_SIZE, export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в NDJSON, '
+        'читая таблицы потоком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Файл для выгрузки (по умолчанию stdout).')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк читать из базы за раз.')
+
+    def handle(self, *args, **options):
+        log = (
+            self.stderr.write if options['verbosity'] > 1 else None)
+        if not options['output']:
+            export(sys.stdout, options['batch_size'], log)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            exported = export(output, options['batch_size'], log)
+        for label, count in exported.items():
+            self.stdout.write(f'{label}: {count}')
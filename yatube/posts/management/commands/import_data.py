@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import BATCH_SIZE, ImportConflict, Importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON из export_data пачками bulk_create. Прерванную '
+        'загрузку можно продолжить: смещение хранится в чекпойнте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк вставлять в одной транзакции.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл чекпойнта (по умолчанию <path>.checkpoint).')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на чекпойнт.')
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        importer = Importer(
+            options['path'],
+            batch_size=options['batch_size'],
+            checkpoint=options['checkpoint'],
+            log=log,
+        )
+        try:
+            created, skipped = importer.run(restart=options['restart'])
+        except ImportConflict as exc:
+            raise CommandError(exc)
+        for label, count in created.items():
+            self.stdout.write(
+                f'{label}: {count} (пропущено {skipped[label]})')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_backend, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс постов, читая посты пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать за раз.')
+
+    def handle(self, *args, **options):
+        backend = type(get_backend()).__name__
+        indexed = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'{backend}: проиндексировано постов: {indexed}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import schedule_missing
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь миниатюры картинок постов, у которых их нет '
+        '(например, после импорта); рисует их воркер run_jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='redraw',
+            help='Перерисовать все картинки (после смены THUMBNAIL_WIDTHS).')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько задач ставить в одной транзакции.')
+
+    def handle(self, *args, **options):
+        scheduled = schedule_missing(
+            redraw=options['redraw'], batch_size=options['batch_size'])
+        self.stdout.write(f'Поставлено в очередь картинок: {scheduled}')
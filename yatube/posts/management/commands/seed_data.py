@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заливает правдоподобные данные для нагрузочных замеров: '
+        'пользователей, группы, посты с картинками, подписки и комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Сколько авторов читает каждый новый пользователь.')
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок создать для постов.')
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять за один запрос.')
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора, чтобы повторить те же данные.')
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        seeder = Seeder(
+            seed=options['seed'], batch_size=options['batch_size'], log=log)
+        created = seeder.run(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            comments=options['comments'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+        )
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.notifications import BATCH_SIZE, send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает подписчикам дайджесты о новых постах сразу, '
+        'не дожидаясь фоновой задачи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total, more = 0, True
+        while more:
+            sent, more = send_digests(options['batch_size'])
+            total += sent
+        self.stdout.write(f'Отправлено писем: {total}')
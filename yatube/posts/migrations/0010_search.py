@@ -0,0 +1,182 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:44
+
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import DatabaseError, migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_post_fts'
+
+# Копия posts/stemmer.py на момент миграции: миграция не должна зависеть
+# от живого кода приложения, который потом может поменяться.
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+# Окончания первой группы должны стоять после «а» или «я».
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+@lru_cache(maxsize=None)
+def _candidates(endings, after_a):
+    """Окончания группы от длинных к коротким (считаем один раз)."""
+    candidates = [(ending, False) for ending in endings]
+    candidates += [(ending, True) for ending in after_a]
+    return sorted(candidates, key=lambda item: len(item[0]), reverse=True)
+
+
+def _remove(word, endings, after_a=()):
+    """Снимаем самое длинное подходящее окончание или возвращаем None."""
+    for ending, needs_a in _candidates(endings, after_a):
+        if not word.endswith(ending):
+            continue
+        base = word[:-len(ending)]
+        if needs_a and not base.endswith(('а', 'я')):
+            continue
+        return base
+    return None
+
+
+def _region(word):
+    """R1 по Snowball: всё после первой согласной, идущей за гласной."""
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return word[index + 1:]
+    return ''
+
+
+def _step1(rv):
+    base = _remove(rv, PERFECTIVE_GERUND[1], PERFECTIVE_GERUND[0])
+    if base is not None:
+        return base
+    rv = _remove(rv, REFLEXIVE) or rv
+    base = _remove(rv, ADJECTIVE)
+    if base is not None:
+        return _remove(base, PARTICIPLE[1], PARTICIPLE[0]) or base
+    base = _remove(rv, VERB[1], VERB[0])
+    if base is not None:
+        return base
+    base = _remove(rv, NOUN)
+    return rv if base is None else base
+
+
+# Словарь текстов невелик, а одни и те же слова встречаются постоянно.
+@lru_cache(maxsize=100_000)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    match = re.search(f'[{VOWELS}]', word)
+    if match is None:
+        return word
+    prefix, rv = word[:match.end()], word[match.end():]
+    rv = _step1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r2 = _region(_region(prefix + rv))
+    for ending in DERIVATIONAL:
+        if r2.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        base = _remove(rv, SUPERLATIVE)
+        if base is not None:
+            rv = base[:-1] if base.endswith('нн') else base
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+
+def create_search_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    fts5 = schema_editor.connection.vendor == 'sqlite'
+    if fts5:
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} '
+                f"USING fts5(terms, tokenize='unicode61')"
+            )
+        except DatabaseError:
+            fts5 = False
+    posts = Post.objects.order_by().values_list('id', 'text')
+    if fts5:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [(pk, ' '.join(terms(text))) for pk, text in posts.iterator()],
+            )
+        return
+    SearchTerm.objects.bulk_create(
+        [
+            SearchTerm(term=term[:64], post_id=pk, weight=count)
+            for pk, text in posts.iterator()
+            for term, count in Counter(
+                term[:64] for term in terms(text)).items()
+        ],
+        batch_size=500,
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Число вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique search term'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
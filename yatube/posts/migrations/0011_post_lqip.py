@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='lqip',
+            field=models.TextField(blank=True, editable=False, help_text='Размытое превью картинки в виде data URI', verbose_name='Заглушка картинки'),
+        ),
+    ]
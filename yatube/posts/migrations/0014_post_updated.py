@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, help_text='Входит в ключ закэшированной карточки поста', verbose_name='Изменён'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_authorstats_pulled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingnotification',
+            name='sent_until',
+            field=models.PositiveIntegerField(default=0, verbose_name='Разослано подписчикам с id до'),
+        ),
+    ]
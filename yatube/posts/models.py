@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 
 User = get_user_model()
 
@@ -8,6 +8,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
 
     def __str__(self):
         return self.title
@@ -18,6 +19,9 @@ class Post(models.Model):
         verbose_name="Текст",
         help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField(
+        'Изменён', auto_now=True,
+        help_text='Входит в ключ закэшированной карточки поста')
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='posts'
@@ -34,13 +38,39 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    lqip = models.TextField(
+        'Заглушка картинки', blank=True, editable=False,
+        help_text='Размытое превью картинки в виде data URI')
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0)
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты листаются по ключу (pub_date, id): индексы отдают строки
+        # уже в порядке страницы, без сортировки во временном B-дереве.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчики обновляются в post_save в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -56,9 +86,21 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField('date published', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created'
+            ),
+        ]
+
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -78,3 +120,93 @@ class Follow(models.Model):
                 name='unique follow'
             ),
         ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        'Количество подписок', default=0)
+    pulled = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении', default=False)
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique timeline entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date'
+            ),
+        ]
+
+
+class PendingNotification(models.Model):
+    """Новый пост, о котором ещё не написали подписчикам автора."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pending_notification'
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    # Подписчики идут пачками по возрастанию id; отметка сдвигается
+    # вместе с отправкой пачки, и повтор не пишет им второй раз.
+    sent_until = models.PositiveIntegerField(
+        'Разослано подписчикам с id до', default=0)
+
+    def __str__(self):
+        return f'Уведомление о посте {self.post_id}'
+
+
+class SearchTerm(models.Model):
+    """Обратный индекс для поиска, когда в базе нет FTS5."""
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    weight = models.PositiveIntegerField('Число вхождений', default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique search term'
+            ),
+        ]
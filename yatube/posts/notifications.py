@@ -0,0 +1,121 @@
+"""Письма-дайджесты подписчикам о новых постах.
+
+Публикация поста стоит одной строки PendingNotification и постановки
+задачи send_digests с задержкой DIGEST_DELAY (с ключом дедупликации:
+пока задача ждёт, новые посты просто копятся). Задача берёт
+накопленные события, обходит подписки их авторов пачками подписчиков
+и собирает каждому одно письмо со всеми новыми постами его авторов.
+Письма пачки уходят через одно подключение EMAIL_BACKEND.
+
+Подписчики обходятся по возрастанию id, и в транзакции отправки пачки
+у событий сдвигается отметка sent_until. Задача, упавшая на середине,
+при повторе пишет только тем, до кого пачка не дошла. События
+удаляются, когда разосланы все пачки.
+"""
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import Follow, PendingNotification, Post
+
+DIGEST_DELAY = getattr(settings, 'DIGEST_DELAY', 10 * 60)
+DIGEST_KEY = 'digests'
+# Событий за один запуск; остаток подберёт следующий.
+EVENTS_PER_RUN = 500
+BATCH_SIZE = 400
+POSTS_IN_DIGEST = 10
+
+
+def record(post):
+    PendingNotification.objects.create(post=post)
+
+
+def absolute_url(path):
+    return getattr(settings, 'SITE_URL', 'http://localhost:8000') + path
+
+
+def follower_batches(author_ids, batch_size, after=0):
+    """Пачки {подписчик: [id авторов]} с адресом у подписчика.
+
+    Подписчики идут по возрастанию id, начиная с id больше after.
+    """
+    follows = Follow.objects.filter(
+        author_id__in=author_ids).exclude(user__email='')
+    last_user_id = after
+    while True:
+        user_ids = list(
+            follows.filter(user_id__gt=last_user_id)
+            .order_by('user_id').values_list('user_id', flat=True)
+            .distinct()[:batch_size])
+        if not user_ids:
+            return
+        batch = {}
+        rows = follows.filter(user_id__in=user_ids).select_related('user')
+        for follow in rows:
+            batch.setdefault(follow.user, []).append(follow.author_id)
+        yield batch
+        last_user_id = user_ids[-1]
+
+
+def build_digest(user, posts):
+    context = {
+        'user': user,
+        'posts': [
+            (post, absolute_url(reverse('posts:post_detail', args=[post.pk])))
+            for post in posts[:POSTS_IN_DIGEST]
+        ],
+        'more': len(posts) - POSTS_IN_DIGEST,
+        'follow_url': absolute_url(reverse('posts:follow_index')),
+    }
+    return mail.EmailMessage(
+        f'Новые посты в ваших подписках: {len(posts)}',
+        render_to_string('posts/email/digest.txt', context),
+        to=[user.email],
+    )
+
+
+def send_digests(batch_size=BATCH_SIZE):
+    """Рассылаем дайджесты по накопленным событиям.
+
+    Возвращаем число писем и признак, что события остались.
+    """
+    pending = list(
+        PendingNotification.objects.order_by('post_id')
+        .values_list('post_id', 'sent_until')[:EVENTS_PER_RUN + 1])
+    more = len(pending) > EVENTS_PER_RUN
+    sent_until = dict(pending[:EVENTS_PER_RUN])
+    post_ids = list(sent_until)
+    events = PendingNotification.objects.filter(post_id__in=post_ids)
+    posts_by_author = {}
+    posts = Post.objects.filter(pk__in=post_ids).select_related(
+        'author').order_by('-pub_date', '-id')
+    for post in posts:
+        posts_by_author.setdefault(post.author_id, []).append(post)
+    sent = 0
+    batches = follower_batches(
+        list(posts_by_author), batch_size, min(sent_until.values(), default=0))
+    for batch in batches:
+        messages = []
+        for user, author_ids in batch.items():
+            # О постах, чья отметка уже дальше, подписчику написали
+            # в прошлый, упавший запуск.
+            new_posts = sorted(
+                (post for author_id in author_ids
+                 for post in posts_by_author[author_id]
+                 if sent_until[post.pk] < user.pk),
+                key=lambda post: (post.pub_date, post.pk), reverse=True)
+            if new_posts:
+                messages.append(build_digest(user, new_posts))
+        last_user_id = max(user.pk for user in batch)
+        # Отметка пишется после писем, но в той же транзакции: если
+        # отправка упала, она откатится, а блокировку на запись SQLite
+        # возьмёт только UPDATE в конце.
+        with transaction.atomic():
+            with mail.get_connection() as connection:
+                sent += connection.send_messages(messages)
+            events.filter(sent_until__lt=last_user_id).update(
+                sent_until=last_user_id)
+    events.delete()
+    return sent, more
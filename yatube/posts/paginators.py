@@ -0,0 +1,250 @@
+import base64
+import binascii
+import datetime
+import json
+from collections.abc import Sequence
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core import generations
+
+from .cache import FEED_CACHE_TIMEOUT
+
+# Целые за пределами 64 бит база не примет (OverflowError).
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Как DjangoJSONEncoder, но не обрезает микросекунды у дат."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Упаковываем значения ключа сортировки в непрозрачный токен."""
+    raw = json.dumps(list(values), cls=CursorEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Распаковываем токен; для битого токена возвращаем None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации, совместимая с шаблонами Page.
+
+    Запрос выполняется лениво, при первом обращении к записям или
+    курсорам: если страница целиком взята из кэша фрагментов, в базу мы
+    не ходим вовсе.
+    """
+
+    def __init__(self, paginator, after_values=None, before_values=None,
+                 cursor=''):
+        self.paginator = paginator
+        self.after_values = after_values
+        self.before_values = before_values
+        self.cursor = cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    @cached_property
+    def _result(self):
+        return self.paginator.fetch(self.after_values, self.before_values)
+
+    @property
+    def object_list(self):
+        return self._result[0]
+
+    @property
+    def next_cursor(self):
+        return self._result[1]
+
+    @property
+    def previous_cursor(self):
+        return self._result[2]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        # Шаблоны пробуют page_obj['cursor'] раньше атрибута: такой
+        # поиск не должен выполнять запрос.
+        if not isinstance(index, (int, slice)):
+            raise TypeError(index)
+        return self.object_list[index]
+
+    def has_next(self):
+        return bool(self.next_cursor)
+
+    def has_previous(self):
+        return bool(self.previous_cursor)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу сортировки (keyset) без COUNT(*) и OFFSET.
+
+    Каждая страница — это диапазонный запрос «строго после/до» курсора,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Последнее поле ordering должно быть уникальным (обычно id).
+    transform превращает строки страницы в то, что увидит шаблон
+    (например, записи ленты в сами посты); курсоры считаются до него.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 transform=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+        self.transform = transform
+
+    def to_python(self, name, value):
+        """Значение курсора в типе поля сортировки."""
+        field = self.object_list.model._meta.get_field(name)
+        return field.to_python(value)
+
+    def parse_cursor(self, token):
+        """Значения курсора или None, если токен битый или подделан."""
+        values = decode_cursor(token, len(self.fields))
+        if values is None:
+            return None
+        try:
+            values = [
+                self.to_python(name, value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        # Поля ключа сортировки не бывают пустыми.
+        if any(
+            value is None
+            or isinstance(value, int) and value not in INTEGER_RANGE
+            for value in values
+        ):
+            return None
+        return values
+
+    def cursor_for(self, row):
+        if isinstance(row, dict):
+            return encode_cursor(row[name] for name in self.fields)
+        return encode_cursor(getattr(row, name) for name in self.fields)
+
+    def _seek(self, values, forward):
+        """Условие «строки строго после (или до) значений курсора»."""
+        condition = Q()
+        for index, order in enumerate(self.ordering):
+            descending = order.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            step = Q(**{f'{self.fields[index]}__{lookup}': values[index]})
+            for name, value in zip(self.fields[:index], values):
+                step &= Q(**{name: value})
+            condition |= step
+        if len(self.fields) > 1:
+            # Через OR база не видит границы диапазона и листает индекс
+            # с начала; нестрогое условие по первому полю даёт ей старт.
+            descending = self.ordering[0].startswith('-')
+            lookup = 'lte' if descending == forward else 'gte'
+            condition &= Q(**{f'{self.fields[0]}__{lookup}': values[0]})
+        return condition
+
+    @staticmethod
+    def _reverse(order):
+        return order[1:] if order.startswith('-') else f'-{order}'
+
+    def get_page(self, after=None, before=None):
+        """Возвращаем страницу после курсора after или до курсора before.
+
+        Некорректный курсор, как и в Paginator.get_page, даёт первую
+        страницу.
+        """
+        after_values = self.parse_cursor(after)
+        if after_values is not None:
+            return CursorPage(self, after_values=after_values,
+                              cursor=f'after:{after}')
+        before_values = self.parse_cursor(before)
+        if before_values is not None:
+            return CursorPage(self, before_values=before_values,
+                              cursor=f'before:{before}')
+        return CursorPage(self)
+
+    def fetch(self, after_values=None, before_values=None):
+        """Строки страницы и курсоры соседних страниц."""
+        queryset = self.object_list
+        limit = self.per_page + 1
+        if before_values is not None:
+            rows = list(
+                queryset.filter(self._seek(before_values, forward=False))
+                .order_by(*map(self._reverse, self.ordering))[:limit]
+            )
+            has_previous = len(rows) > self.per_page
+            return self._result(rows[:self.per_page][::-1], True, has_previous)
+        if after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, forward=True))
+        rows = list(queryset.order_by(*self.ordering)[:limit])
+        return self._result(rows[:self.per_page], len(rows) > self.per_page,
+                            after_values is not None)
+
+    def _result(self, rows, has_next, has_previous):
+        if not rows:
+            return rows, '', ''
+        next_cursor = self.cursor_for(rows[-1]) if has_next else ''
+        previous_cursor = self.cursor_for(rows[0]) if has_previous else ''
+        if self.transform is not None:
+            rows = self.transform(rows)
+        return rows, next_cursor, previous_cursor
+
+
+def get_page(request, object_list, per_page, ordering=('-pub_date', '-id'),
+             transform=None):
+    """Страница курсорной пагинации по параметрам ?after=/?before=."""
+    paginator = CursorPaginator(object_list, per_page, ordering, transform)
+    return paginator.get_page(
+        request.GET.get('after'), request.GET.get('before'))
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с числом объектов из кэша области (posts.cache).
+
+    Для общей ленты, группы или автора COUNT(*) выполняется один раз
+    на поколение области: запись поста сдвигает поколение, и число
+    пересчитывается. Без scope считает как обычный Paginator.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, scope=None):
+        super().__init__(
+            object_list, per_page, orphans, allow_empty_first_page)
+        self.scope = scope
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return super().count
+        key = f'count:{self.scope}:{generations.version(self.scope)}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, FEED_CACHE_TIMEOUT)
+        return count
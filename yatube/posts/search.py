@@ -0,0 +1,203 @@
+"""Полнотекстовый поиск по постам.
+
+Основной движок — виртуальная таблица SQLite FTS5 с основами слов
+(см. stemmer.py) и ранжированием bm25. Если FTS5 недоступна (другая
+СУБД или SQLite без расширения), используется обратный индекс
+SearchTerm с ранжированием tf-idf на Python. Индекс обновляется
+сигналами Post и пересобирается командой rebuild_search_index.
+
+Меньший score — более релевантный пост, как у bm25 в FTS5.
+"""
+import math
+from collections import Counter
+
+from django.db import connection, connections, router, transaction
+from django.db.models import Count
+
+from .models import Post, SearchTerm
+from .paginators import CursorPaginator, encode_cursor
+from .stemmer import terms
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERM_LENGTH = 64
+
+
+_fts5_tables = {}
+
+
+def fts5_available():
+    """Есть ли в текущей базе таблица FTS5 (проверяем один раз)."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_tables:
+        _fts5_tables[name] = (
+            FTS_TABLE in connection.introspection.table_names())
+    return _fts5_tables[name]
+
+
+class Fts5Backend:
+    def index(self, rows):
+        """rows — пары (id поста, текст)."""
+        rows = [(pk, ' '.join(terms(text))) for pk, text in rows]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                rows)
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, query_terms, seek=None, forward=True, limit=10):
+        """Пары (id поста, score) в порядке релевантности."""
+        match = ' '.join(f'"{term}"' for term in query_terms)
+        compare, order = ('>', 'ASC') if forward else ('<', 'DESC')
+        sql = (
+            f'SELECT rowid, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [match]
+        if seek is not None:
+            sql += (
+                f' AND (score {compare} %s'
+                f' OR (score = %s AND rowid {compare} %s))'
+            )
+            params += [seek[0], seek[0], seek[1]]
+        sql += f' ORDER BY score {order}, rowid {order} LIMIT %s'
+        params.append(limit)
+        # Чтение идёт туда же, куда ORM: на реплику у @replica_reads view.
+        using = router.db_for_read(Post)
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class InvertedIndexBackend:
+    def index(self, rows):
+        rows = list(rows)
+        SearchTerm.objects.filter(post_id__in=[pk for pk, _ in rows]).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term[:MAX_TERM_LENGTH], post_id=pk, weight=count)
+            for pk, text in rows
+            for term, count in Counter(
+                term[:MAX_TERM_LENGTH] for term in terms(text)).items()
+        )
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def search(self, query_terms, seek=None, forward=True, limit=10):
+        total = SearchTerm.objects.values('post_id').distinct().count()
+        document_counts = dict(
+            SearchTerm.objects.filter(term__in=query_terms)
+            .values_list('term').annotate(Count('post_id'))
+        )
+        if total == 0 or set(query_terms) - set(document_counts):
+            return []
+        scores = {}
+        found = SearchTerm.objects.filter(
+            term__in=query_terms).values_list('post_id', 'term', 'weight')
+        matched = Counter()
+        for post_id, term, weight in found.iterator():
+            idf = math.log(1 + total / document_counts[term])
+            scores[post_id] = scores.get(post_id, 0) - weight * idf
+            matched[post_id] += 1
+        ranked = sorted(
+            (score, pk) for pk, score in scores.items()
+            if matched[pk] == len(query_terms)
+        )
+        if not forward:
+            ranked.reverse()
+        if seek is not None:
+            seek = tuple(seek)
+            ranked = [
+                row for row in ranked
+                if (row > seek if forward else row < seek)
+            ]
+        return [(pk, score) for score, pk in ranked[:limit]]
+
+
+def get_backend():
+    return Fts5Backend() if fts5_available() else InvertedIndexBackend()
+
+
+def index_post(post):
+    get_backend().index([(post.pk, post.text)])
+
+
+def remove_post(post_id):
+    get_backend().remove(post_id)
+
+
+def rebuild(batch_size=1000):
+    """Переиндексируем все посты, читая их потоком пачками.
+
+    Каждая пачка пишется в своей транзакции: в режиме autocommit SQLite
+    фиксирует на диск каждую вставленную строку.
+    """
+    backend = get_backend()
+    backend.clear()
+    batch = []
+    indexed = 0
+    posts = Post.objects.order_by().values_list('id', 'text')
+    for row in posts.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with transaction.atomic():
+                backend.index(batch)
+            indexed += len(batch)
+            batch = []
+    if batch:
+        with transaction.atomic():
+            backend.index(batch)
+        indexed += len(batch)
+    return indexed
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по ключу (score, id)."""
+
+    def __init__(self, query, per_page):
+        super().__init__(None, per_page, ordering=('score', 'id'))
+        self.query_terms = sorted(set(terms(query)))
+        self.backend = get_backend()
+
+    def to_python(self, name, value):
+        value = float(value) if name == 'score' else int(value)
+        if not math.isfinite(value):
+            raise ValueError(value)
+        return value
+
+    def fetch(self, after_values=None, before_values=None):
+        if not self.query_terms:
+            return [], '', ''
+        forward = before_values is None
+        seek = after_values if forward else before_values
+        hits = self.backend.search(
+            self.query_terms, seek, forward, self.per_page + 1)
+        has_more = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        if not forward:
+            hits.reverse()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in hits])
+        rows = [posts[pk] for pk, _ in hits if pk in posts]
+        if not hits:
+            return rows, '', ''
+        has_next = has_more if forward else True
+        has_previous = seek is not None if forward else has_more
+        next_cursor = encode_cursor(hits[-1][::-1]) if has_next else ''
+        previous_cursor = encode_cursor(hits[0][::-1]) if has_previous else ''
+        return rows, next_cursor, previous_cursor
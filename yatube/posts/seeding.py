@@ -0,0 +1,209 @@
+"""Заливка правдоподобных данных для нагрузочных замеров.
+
+Пользователи и группы создаются mixer, тексты — Faker на русском (иначе
+поиск со стеммером мерить бессмысленно). Популярность неравномерна:
+немногие авторы пишут большую часть постов и собирают большую часть
+подписчиков. Строки пишутся bulk_create пачками мимо сигналов, поэтому
+в конце счётчики, ленты подписок и поисковый индекс пересобираются
+целиком.
+"""
+import datetime
+import io
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.functional import cached_property
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from .derived import explicit_dates, rebuild_derived
+from .models import Comment, Follow, Group, Post, User
+
+LOCALE = 'ru_RU'
+TEXT_POOL_SIZE = 2000
+HISTORY = datetime.timedelta(days=3 * 365)
+IMAGE_SIZE = (1600, 1200)
+# Чем больше показатель, тем сильнее посты и подписчики сосредоточены
+# у немногих популярных авторов.
+POPULARITY_SKEW = 0.9
+
+
+class Seeder:
+    def __init__(self, seed=None, batch_size=5000, log=None):
+        self.random = random.Random(seed)
+        self.faker = Faker(LOCALE)
+        self.faker.seed_instance(seed)
+        self.mixer = Mixer(commit=False, locale=LOCALE)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    @cached_property
+    def texts(self):
+        """Запас абзацев: звать Faker на каждый пост слишком медленно."""
+        return [
+            self.faker.paragraph(nb_sentences=self.random.randint(1, 6))
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+
+    def text(self, paragraphs=3):
+        return '\n\n'.join(self.random.sample(
+            self.texts, self.random.randint(1, paragraphs)))
+
+    def past(self):
+        return self.now - HISTORY * self.random.random()
+
+    def popularity(self, ids):
+        """Накопленные веса для random.choices: первые id популярнее."""
+        ids = list(ids)
+        self.random.shuffle(ids)
+        weights = itertools.accumulate(
+            1 / (rank + 1) ** POPULARITY_SKEW for rank in range(len(ids)))
+        return ids, list(weights)
+
+    def bulk_create(self, model, objects):
+        """Пишем объекты пачками по batch_size, каждую в своей транзакции."""
+        created = 0
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return created
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            created += len(batch)
+            self.log(f'{model._meta.verbose_name_plural}: {created}')
+
+    def new_ids(self, model, objects):
+        """Создаём объекты и возвращаем id новых строк."""
+        last_id = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.bulk_create(model, objects)
+        return list(
+            model.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True))
+
+    def users(self, count):
+        start = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        password = make_password(None)
+        return self.new_ids(User, self.mixer.cycle(count).blend(
+            User,
+            username=self.mixer.sequence(lambda n: f'seed{start + n}'),
+            password=password,
+            is_staff=False,
+            is_superuser=False,
+            is_active=True,
+        ))
+
+    def groups(self, count):
+        start = (Group.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        return self.new_ids(Group, self.mixer.cycle(count).blend(
+            Group,
+            title=lambda: self.faker.catch_phrase(),
+            slug=self.mixer.sequence(lambda n: f'seed-{start + n}'),
+            description=lambda: self.faker.paragraph(),
+        ))
+
+    def images(self, count):
+        """Картинки-градиенты размером с фото с телефона."""
+        names = []
+        for number in range(count):
+            colors = [
+                tuple(self.random.randrange(256) for _ in range(3))
+                for _ in range(2)
+            ]
+            image = Image.linear_gradient('L').resize(IMAGE_SIZE)
+            image = Image.merge('RGB', [
+                image.point(lambda v, a=a, b=b: a + (b - a) * v // 255)
+                for a, b in zip(*colors)
+            ])
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            names.append(default_storage.save(
+                f'posts/seed_{number}.jpg', ContentFile(buffer.getvalue())))
+        return names
+
+    def posts(self, count, author_ids, group_ids, images=(),
+              image_ratio=0.0, group_ratio=0.7):
+        authors, weights = self.popularity(author_ids)
+
+        def generate():
+            for _ in range(count):
+                yield Post(
+                    text=self.text(),
+                    author_id=self.random.choices(
+                        authors, cum_weights=weights)[0],
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < group_ratio
+                        else None),
+                    image=(
+                        self.random.choice(images)
+                        if images and self.random.random() < image_ratio
+                        else ''),
+                    pub_date=self.past(),
+                )
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.new_ids(Post, generate())
+
+    def follows(self, user_ids, per_user):
+        """Плотный граф подписок: у популярных авторов больше подписчиков."""
+        authors, weights = self.popularity(user_ids)
+        per_user = min(per_user, len(authors) - 1)
+
+        def generate():
+            for user_id in user_ids:
+                followed = set()
+                while len(followed) < per_user:
+                    author_id = self.random.choices(
+                        authors, cum_weights=weights)[0]
+                    if author_id != user_id:
+                        followed.add(author_id)
+                for author_id in followed:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return self.bulk_create(Follow, generate())
+
+    def comments(self, count, user_ids, post_ids):
+        posts, weights = self.popularity(post_ids)
+
+        def generate():
+            for _ in range(count):
+                yield Comment(
+                    post_id=self.random.choices(posts, cum_weights=weights)[0],
+                    author_id=self.random.choice(user_ids),
+                    text=self.faker.sentence(),
+                    created=self.past(),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            return self.bulk_create(Comment, generate())
+
+    def finish(self):
+        rebuild_derived(self.batch_size, self.log)
+
+    def run(self, users, groups, posts, follows, comments, images=0,
+            image_ratio=0.0):
+        user_ids = self.users(users)
+        group_ids = self.groups(groups)
+        image_names = self.images(images)
+        post_ids = self.posts(
+            posts, user_ids, group_ids, image_names, image_ratio)
+        follows_count = self.follows(user_ids, follows)
+        comments_count = self.comments(comments, user_ids, post_ids)
+        self.finish()
+        return {
+            'users': len(user_ids),
+            'groups': len(group_ids),
+            'images': len(image_names),
+            'posts': len(post_ids),
+            'follows': follows_count,
+            'comments': comments_count,
+        }
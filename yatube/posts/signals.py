@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from core import generations
+
+from . import (
+    cache, cards, counters, live, notifications, search, tasks, timeline)
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+# Поля пользователя, которые видны в карточках его постов.
+DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def display_name(user):
+    return tuple(getattr(user, field) for field in DISPLAY_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def remember_display_name(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем прежнее имя, чтобы сбросить карточки постов автора."""
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(update_fields) & set(DISPLAY_FIELDS)
+    ):
+        return
+    instance._old_display_name = User.objects.filter(
+        pk=instance.pk).values_list(*DISPLAY_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+        return
+    old_name = instance.__dict__.pop('_old_display_name', None)
+    if old_name is not None and old_name != display_name(instance):
+        posts = Post.objects.filter(author=instance)
+        cards.touch(posts)
+        # Имя видно и в лентах групп, и в комментариях к чужим постам.
+        group_ids = posts.exclude(group=None).order_by().values_list(
+            'group_id', flat=True).distinct()
+        post_ids = Comment.objects.filter(
+            author=instance).order_by().values_list(
+            'post_id', flat=True).distinct()
+        generations.bump_on_commit(
+            *map(cache.group_scope, group_ids),
+            *map(cache.post_scope, post_ids))
+    # Вход в систему обновляет только last_login — ленты это не меняет.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        generations.bump_on_commit(
+            cache.GLOBAL_SCOPE, cache.author_scope(instance.pk))
+
+
+def group_posts_changed(group):
+    """Группа видна в карточках своих постов и в лентах их авторов."""
+    posts = Post.objects.filter(group=group)
+    cards.touch(posts)
+    author_ids = posts.order_by().values_list(
+        'author_id', flat=True).distinct()
+    generations.bump_on_commit(
+        cache.GLOBAL_SCOPE, cache.group_scope(group.pk),
+        *map(cache.author_scope, author_ids))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        generations.bump_on_commit(
+            cache.GLOBAL_SCOPE, cache.group_scope(instance.pk))
+    else:
+        group_posts_changed(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    """Посты останутся без группы: ссылка на неё уйдёт из карточек."""
+    group_posts_changed(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминаем прежнюю группу, чтобы поправить счётчики групп."""
+    if not instance._state.adding:
+        instance._old_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Обновляем кэш, поиск, счётчики и ленты подписчиков."""
+    old_group_id = getattr(instance, '_old_group_id', instance.group_id)
+    cache.post_changed(instance, old_group_id)
+    search.index_post(instance)
+    if created:
+        counters.bump_stats(instance.author_id, 'posts_count', 1)
+        if instance.group_id:
+            counters.bump(
+                Group.objects.filter(pk=instance.group_id), 'posts_count', 1)
+        timeline.fan_out(instance)
+        # Письма подписчикам уходят дайджестом, вне запроса.
+        notifications.record(instance)
+        tasks.send_digests.enqueue(
+            key=notifications.DIGEST_KEY, delay=notifications.DIGEST_DELAY)
+        # Ожидающих долгого опроса будим, когда пост уже виден в базе.
+        transaction.on_commit(lambda: live.notifier.publish(instance))
+        return
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            counters.bump(
+                Group.objects.filter(pk=old_group_id), 'posts_count', -1)
+        if instance.group_id:
+            counters.bump(
+                Group.objects.filter(pk=instance.group_id), 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    cache.post_changed(instance)
+    search.remove_post(instance.pk)
+    counters.bump_stats(instance.author_id, 'posts_count', -1)
+    if instance.group_id:
+        counters.bump(
+            Group.objects.filter(pk=instance.group_id), 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    generations.bump_on_commit(cache.post_scope(instance.post_id))
+    if created:
+        counters.bump(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    generations.bump_on_commit(cache.post_scope(instance.post_id))
+    counters.bump(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_stats(instance.author_id, 'followers_count', 1)
+        counters.bump_stats(instance.user_id, 'following_count', 1)
+        timeline.follower_added(instance.author_id)
+        # follower_scope — это и лента, и кэш подписок (graph.py);
+        # профиль подписчика показывает число его подписок.
+        generations.bump_on_commit(
+            cache.follower_scope(instance.user_id),
+            cache.author_scope(instance.author_id),
+            cache.author_scope(instance.user_id))
+        # Последние посты — сразу, хвост — фоновой задачей.
+        if timeline.backfill(
+                instance.user_id, instance.author_id,
+                limit=timeline.BACKFILL_LIMIT):
+            tasks.backfill_timeline.enqueue(
+                instance.user_id, instance.author_id,
+                key=tasks.backfill_key(instance.user_id, instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_stats(instance.author_id, 'followers_count', -1)
+    counters.bump_stats(instance.user_id, 'following_count', -1)
+    generations.bump_on_commit(
+        cache.follower_scope(instance.user_id),
+        cache.author_scope(instance.author_id),
+        cache.author_scope(instance.user_id))
+    timeline.prune(instance.user_id, instance.author_id)
+    if timeline.follower_removed(instance.author_id):
+        tasks.push_author.enqueue(
+            instance.author_id, key=tasks.push_key(instance.author_id))
@@ -0,0 +1,53 @@
+"""Фоновые задачи постов (очередь core/jobs.py, воркер run_jobs)."""
+from core import generations
+from core.jobs import task
+from core.sqlite import write_transaction
+
+from . import cache, notifications, thumbnails, timeline
+from .models import Follow
+
+
+@task(max_attempts=5)
+def backfill_timeline(user_id, author_id):
+    """Раскладываем в ленту подписчика все посты автора.
+
+    При подписке в ленту сразу попадают только последние
+    TIMELINE_BACKFILL_LIMIT постов, остальное доделывает эта задача.
+    Пока она ждала, подписку могли отменить.
+    """
+    with write_transaction():
+        follows = Follow.objects.filter(user_id=user_id, author_id=author_id)
+        if follows.exists():
+            timeline.backfill(user_id, author_id)
+            # Фрагменты ленты, собранные до задачи, без старых постов.
+            generations.bump_on_commit(cache.follower_scope(user_id))
+
+
+def backfill_key(user_id, author_id):
+    return f'backfill:{user_id}:{author_id}'
+
+
+@task(max_attempts=5)
+def push_author(author_id):
+    """Возвращаем автора, ушедшего под порог подписчиков, в раскладку."""
+    with write_transaction():
+        return timeline.push_author(author_id)
+
+
+def push_key(author_id):
+    return f'push:{author_id}'
+
+
+@task(max_attempts=3)
+def render_thumbnails(post_id, name):
+    """Рисуем миниатюры картинки поста и сохраняем заглушку."""
+    thumbnails.build(post_id, name)
+
+
+@task(max_attempts=3, retry_delay=60)
+def send_digests():
+    """Рассылаем дайджесты; остаток событий — следующим запуском."""
+    sent, more = notifications.send_digests()
+    if more:
+        send_digests.enqueue(key=notifications.DIGEST_KEY)
+    return sent
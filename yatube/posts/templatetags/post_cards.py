@@ -0,0 +1,11 @@
+from django import template
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, template_name='includes/card_post.html'):
+    """Отрисованные карточки постов, по возможности из кэша."""
+    return cards.render_cards(posts, template_name)
@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Варианты картинки поста для <picture> или None, пока они рисуются."""
+    return thumbnails.ready_picture(post)
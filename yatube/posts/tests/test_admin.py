@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import cache as feed_cache
+from ..admin import PostAdmin
+from ..models import Group, Post, User
+from ..paginators import CachedCountPaginator
+
+
+def count_queries(context):
+    return [
+        query['sql'] for query in context.captured_queries
+        if 'COUNT(' in query['sql'] and '"posts_post"' in query['sql']
+    ]
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='admin', description='Описание')
+        for number in range(5):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}',
+                group=cls.group if number % 2 else None)
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self, queryset, scope):
+        return CachedCountPaginator(queryset, 2, scope=scope)
+
+    def test_count_is_cached_per_scope(self):
+        posts = Post.objects.all()
+        self.assertEqual(
+            self.paginator(posts, feed_cache.GLOBAL_SCOPE).count, 5)
+        group_posts = Post.objects.filter(group=self.group)
+        scope = feed_cache.group_scope(self.group.pk)
+        self.assertEqual(self.paginator(group_posts, scope).count, 2)
+        with self.assertNumQueries(0):
+            paginator = self.paginator(posts, feed_cache.GLOBAL_SCOPE)
+            self.assertEqual(paginator.num_pages, 3)
+            self.assertEqual(self.paginator(group_posts, scope).count, 2)
+
+    def test_post_write_invalidates_count(self):
+        scope = feed_cache.group_scope(self.group.pk)
+        group_posts = Post.objects.filter(group=self.group)
+        self.paginator(group_posts, scope).count
+        Post.objects.create(
+            author=self.author, text='Новый', group=self.group)
+        self.assertEqual(self.paginator(group_posts, scope).count, 3)
+        Post.objects.filter(group=self.group).first().delete()
+        self.assertEqual(self.paginator(group_posts, scope).count, 2)
+
+    def test_without_scope_counts_every_time(self):
+        with self.assertNumQueries(1):
+            self.paginator(Post.objects.all(), None).count
+        with self.assertNumQueries(1):
+            self.paginator(Post.objects.all(), None).count
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Группа', slug='admin', description='Описание')
+        for number in range(3):
+            Post.objects.create(
+                author=cls.admin, text=f'Пост {number}', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_count_scope(self):
+        factory = RequestFactory()
+        cases = {
+            '': feed_cache.GLOBAL_SCOPE,
+            '?p=2&o=-3': feed_cache.GLOBAL_SCOPE,
+            '?group__id__exact=7': feed_cache.group_scope(7),
+            '?author__id__exact=3&p=1': feed_cache.author_scope(3),
+            '?group__id__exact=7&author__id__exact=3': None,
+            '?q=пост': None,
+            '?group__id__exact=x': None,
+        }
+        for query, scope in cases.items():
+            with self.subTest(query=query):
+                request = factory.get('/admin/posts/post/' + query)
+                self.assertEqual(PostAdmin.count_scope(request), scope)
+
+    def test_changelist_reuses_cached_count(self):
+        url = reverse('admin:posts_post_changelist')
+        for query in ('', f'?group__id__exact={self.group.pk}'):
+            with self.subTest(query=query):
+                with CaptureQueriesContext(connection) as first:
+                    response = self.client.get(url + query)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Пост 2')
+                self.assertTrue(count_queries(first))
+                with CaptureQueriesContext(connection) as second:
+                    self.client.get(url + query)
+                self.assertEqual(count_queries(second), [])
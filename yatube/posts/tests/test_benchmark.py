@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..benchmark import compare, percentile
+from ..models import AuthorStats, Comment, Follow, Group, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class SeedAndBenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', users=8, groups=2, posts=40, follows=3,
+            comments=30, images=1, image_ratio=0.5, batch_size=16, seed=1,
+            stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seeded_data(self):
+        """Данные залиты, производные структуры пересобраны."""
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 8 * 3)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        stats = AuthorStats.objects.get(
+            user=Post.objects.first().author)
+        self.assertEqual(stats.posts_count, stats.user.posts.count())
+        expected = sum(
+            Post.objects.filter(author_id=follow.author_id).count()
+            for follow in Follow.objects.all())
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+
+    def test_benchmark_report(self):
+        """Отчёт содержит перцентили и запросы всех читающих страниц."""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'benchmark.json')
+        user = Post.objects.first().author
+        call_command(
+            'benchmark', requests=3, warmup=1, memory_samples=1,
+            user=user.username, output=output, stdout=StringIO())
+        with open(output) as file_:
+            report = json.load(file_)
+        results = report['results']
+        self.assertIn('guest:index', results)
+        self.assertIn('user:post_edit', results)
+        self.assertNotIn('user:profile_follow', results)
+        self.assertEqual(results['user:follow_index']['status'], 200)
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        rows = compare(report, report)
+        self.assertTrue(rows)
+        self.assertTrue(all(change in (0, None) for *_, change in rows))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
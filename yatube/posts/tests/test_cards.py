@@ -0,0 +1,154 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..cards import card_key, render_cards
+from ..models import Comment, Follow, Group, Post, User
+
+FEED_CARD = 'includes/card_feed.html'
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh(self, post):
+        return Post.objects.select_related('author', 'group').get(pk=post.pk)
+
+    def test_page_cards_are_read_with_one_get_many(self):
+        render_cards(self.posts, FEED_CARD)
+        with mock.patch(
+                'posts.cards.cache.get_many',
+                wraps=cache.get_many) as get_many, \
+                mock.patch('posts.cards.get_template') as get_template:
+            cards = render_cards(self.posts, FEED_CARD)
+        get_many.assert_called_once()
+        get_template.assert_not_called()
+        self.assertEqual(len(cards), 3)
+        self.assertIn('Пост 2', cards[2])
+
+    def test_feeds_share_cards(self):
+        Client().get(reverse('posts:index'))
+        for post in self.posts:
+            self.assertIsNotNone(cache.get(card_key(post, FEED_CARD)))
+        Client().get(reverse('posts:profile', args=[self.author.username]))
+        self.assertIsNotNone(
+            cache.get(card_key(self.posts[0], 'includes/card_post.html')))
+
+    def test_edit_changes_key(self):
+        post = self.fresh(self.posts[0])
+        render_cards([post], FEED_CARD)
+        post.text = 'Исправленный пост'
+        post.save()
+        [card] = render_cards([self.fresh(post)], FEED_CARD)
+        self.assertIn('Исправленный пост', card)
+
+    def test_group_change_invalidates_cards(self):
+        render_cards([self.fresh(self.posts[0])], FEED_CARD)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        [card] = render_cards([self.fresh(self.posts[0])], FEED_CARD)
+        self.assertIn('/group/renamed/', card)
+
+    def test_group_delete_invalidates_cards(self):
+        group = Group.objects.create(
+            title='Временная', slug='temporary', description='Описание')
+        post = Post.objects.create(
+            author=self.author, group=group, text='В группе')
+        render_cards([self.fresh(post)], FEED_CARD)
+        group.delete()
+        [card] = render_cards([self.fresh(post)], FEED_CARD)
+        self.assertNotIn('/group/temporary/', card)
+
+    def test_author_name_change_invalidates_cards(self):
+        render_cards([self.fresh(self.posts[0])], FEED_CARD)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Фёдор'
+        author.last_name = 'Достоевский'
+        author.save()
+        [card] = render_cards([self.fresh(self.posts[0])], FEED_CARD)
+        self.assertIn('Фёдор Достоевский', card)
+
+    def test_login_keeps_cards(self):
+        updated = self.fresh(self.posts[0]).updated
+        author = User.objects.get(pk=self.author.pk)
+        author.save(update_fields=['last_login'])
+        author.set_password('secret')
+        author.save()
+        self.assertEqual(self.fresh(self.posts[0]).updated, updated)
+
+
+class CardScopesTest(TestCase):
+    """Ленты с чужими карточками сбрасываются вместе с карточками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='scopes', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.follower = Client()
+        self.follower.force_login(self.reader)
+
+    def test_group_change_refreshes_author_feeds(self):
+        profile = reverse('posts:profile', args=[self.author.username])
+        follow = reverse('posts:follow_index')
+        self.guest.get(profile)
+        self.follower.get(profile)
+        self.follower.get(follow)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        for client, url in (
+            (self.guest, profile), (self.follower, profile),
+            (self.follower, follow),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertNotContains(response, '/group/scopes/')
+                self.assertContains(response, '/group/renamed/')
+
+    def test_group_delete_refreshes_author_feeds(self):
+        profile = reverse('posts:profile', args=[self.author.username])
+        self.guest.get(profile)
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertNotContains(self.guest.get(profile), '/group/scopes/')
+
+    def test_rename_refreshes_group_feed_and_comments(self):
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        group_url = reverse('posts:group_list', args=[self.group.slug])
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        self.guest.get(group_url)
+        self.guest.get(post_url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name, author.last_name = 'Фёдор', 'Достоевский'
+        author.save()
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.username = 'critic'
+        reader.save()
+        self.assertContains(self.guest.get(group_url), 'Фёдор Достоевский')
+        self.assertContains(self.guest.get(post_url), 'critic')
@@ -1,18 +1,30 @@
+import io
 import shutil
+import struct
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image, ImageSequence
+
+from core import jobs
+from core.models import Job
+from posts import tasks, thumbnails
 from posts.models import Comment, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+# Миниатюры рисуются прямо в запросе, поэтому бюджеты запросов не считаем.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   QUERY_BUDGET_MODE='off')
 class PostCreateFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -37,6 +49,8 @@ class PostCreateFormTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Вёдра ограничения частоты живут в кэше и переживают тесты.
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -129,3 +143,199 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(Comment.objects.count(), count_comment + 1)
         self.assertTrue(Comment.objects
                         .filter(text=form_data['text']).exists())
+
+    def post_image(self, name, content, content_type='image/gif'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Проверка картинки',
+                'image': SimpleUploadedFile(
+                    name=name, content=content, content_type=content_type),
+            },
+        )
+
+    @override_settings(MAX_UPLOAD_SIZE=16)
+    def test_upload_too_large(self):
+        """Файл больше MAX_UPLOAD_SIZE отклоняется формой."""
+        response = self.post_image('large.gif', self.small_gif)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 0 МБ.')
+        self.assertFalse(
+            Post.objects.filter(text='Проверка картинки').exists())
+
+    @override_settings(MAX_IMAGE_PIXELS=1)
+    def test_upload_too_many_pixels(self):
+        """Картинка больше MAX_IMAGE_PIXELS отклоняется до декодирования."""
+        response = self.post_image('wide.gif', self.small_gif)
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.')
+        self.assertFalse(
+            Post.objects.filter(text='Проверка картинки').exists())
+
+    @override_settings(MAX_IMAGE_DIMENSION=100)
+    def test_upload_normalized(self):
+        """Сохраняется повёрнутая, уменьшенная копия без EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой
+        exif[0x010F] = 'Камера'
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        self.post_image('photo.jpg', buffer.getvalue(), 'image/jpeg')
+        post = Post.objects.get(text='Проверка картинки')
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (67, 100))
+            self.assertNotIn('exif', image.info)
+
+    def test_upload_cmyk_tiff(self):
+        """Формат без своих настроек сохраняется в PNG в режиме RGB."""
+        buffer = io.BytesIO()
+        Image.new('CMYK', (20, 10), (0, 255, 255, 0)).save(buffer, 'TIFF')
+        self.post_image('print.tiff', buffer.getvalue(), 'image/tiff')
+        post = Post.objects.get(text='Проверка картинки')
+        self.assertEqual(post.image.name, 'posts/print.png')
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.mode), ('PNG', 'RGB'))
+
+    def test_undecodable_image_is_rejected(self):
+        """Ошибка кодека — ошибка формы, а не 500."""
+        with mock.patch('posts.images.Image.Image.save',
+                        side_effect=OSError('cannot write')):
+            response = self.post_image('broken.gif', self.small_gif)
+        self.assertFormError(
+            response, 'form', 'image', 'Не удалось обработать картинку.')
+
+    @staticmethod
+    def animated_gif(frames=3, size=(40, 20)):
+        buffer = io.BytesIO()
+        images = [
+            Image.new('RGB', size, color)
+            for color in ('red', 'green', 'blue')[:frames]
+        ]
+        images[0].save(
+            buffer, 'GIF', save_all=True, append_images=images[1:],
+            duration=[100, 200, 300][:frames], loop=0, comment=b'secret')
+        return buffer.getvalue()
+
+    @override_settings(MAX_IMAGE_DIMENSION=10)
+    def test_animation_reencoded(self):
+        """Анимация уменьшается покадрово, без метаданных."""
+        self.post_image('moving.gif', self.animated_gif())
+        post = Post.objects.get(text='Проверка картинки')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.n_frames, 3)
+            self.assertEqual(image.size, (10, 5))
+            self.assertNotIn('comment', image.info)
+            durations = []
+            for frame in ImageSequence.Iterator(image):
+                durations.append(frame.info['duration'])
+        self.assertEqual(durations, [100, 200, 300])
+
+    @override_settings(MAX_IMAGE_FRAMES=2)
+    def test_too_many_frames_rejected(self):
+        response = self.post_image('long.gif', self.animated_gif())
+        self.assertFormError(
+            response, 'form', 'image', 'В анимации больше 2 кадров.')
+
+    @override_settings(MAX_IMAGE_PIXELS=2000)
+    def test_pixels_counted_in_all_frames(self):
+        """40×20 в одном кадре проходит, в трёх — уже нет."""
+        self.post_image('one.gif', self.animated_gif(frames=1))
+        response = self.post_image('three.gif', self.animated_gif())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.')
+        self.assertEqual(
+            Post.objects.filter(text='Проверка картинки').count(), 1)
+
+    def test_broken_exif_rejected(self):
+        """Ошибка разбора EXIF — ошибка формы, а не 500."""
+        with mock.patch('posts.images.ImageOps.exif_transpose',
+                        side_effect=struct.error('unpack requires')):
+            response = self.post_image('exif.gif', self.small_gif)
+        self.assertFormError(
+            response, 'form', 'image', 'Не удалось обработать картинку.')
+
+    def create_post_with_image(self, name):
+        uploaded = SimpleUploadedFile(
+            name=name, content=self.small_gif, content_type='image/gif')
+        return Post.objects.create(
+            author=self.user, text='С картинкой', image=uploaded)
+
+    @staticmethod
+    def thumbnail_jobs():
+        return Job.objects.filter(name=tasks.render_thumbnails.name)
+
+    def test_thumbnail_rendered_on_create(self):
+        """Создание поста ставит миниатюры в очередь, воркер их рисует."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'С картинкой',
+                'image': SimpleUploadedFile(
+                    name='ready.gif', content=self.small_gif,
+                    content_type='image/gif'),
+            },
+        )
+        self.assertEqual(jobs.run_pending(), 1)
+        post = Post.objects.get(text='С картинкой')
+        for _, _, geometry, options in thumbnails.variants(post.image.name):
+            with self.subTest(geometry=geometry, format=options['format']):
+                self.assertIsNotNone(thumbnails.LookupBackend().lookup(
+                    post.image.name, geometry, **options))
+        self.assertTrue(post.lqip.startswith('data:image/jpeg;base64,'))
+
+    def test_picture_variants(self):
+        """Карточка отдаёт <picture> с WebP, srcset и ленивой загрузкой."""
+        post = self.create_post_with_image('picture.gif')
+        thumbnails.schedule(post)
+        jobs.run_pending()
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '.webp 480w')
+        self.assertContains(response, '.gif 960w')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'data:image/jpeg;base64,')
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_thumbnail_scheduled_once(self):
+        """Одна картинка ставится в очередь и в пул только один раз."""
+        post = self.create_post_with_image('once.gif')
+        thumbnails.schedule(post)
+        thumbnails.schedule(post)
+        with mock.patch('posts.thumbnails._get_executor') as executor:
+            executor.return_value.submit.return_value.result.return_value = (
+                'data:image/jpeg;base64,')
+            self.assertEqual(jobs.run_pending(), 1)
+        executor.return_value.submit.assert_called_once()
+        post.refresh_from_db()
+        self.assertEqual(post.lqip, 'data:image/jpeg;base64,')
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, шаблон показывает заглушку и не рисует её."""
+        post = self.create_post_with_image('later.gif')
+        with mock.patch('posts.thumbnails.render') as render:
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        render.assert_not_called()
+        self.assertFalse(self.thumbnail_jobs().exists())
+
+    def test_render_thumbnails_command(self):
+        """Команда ставит в очередь только картинки без заглушки."""
+        post = self.create_post_with_image('missing.gif')
+        Post.objects.create(
+            author=self.user, text='Готовая', lqip='data:,',
+            image=SimpleUploadedFile(
+                name='drawn.gif', content=self.small_gif,
+                content_type='image/gif'))
+        out = io.StringIO()
+        call_command('render_thumbnails', stdout=out)
+        self.assertIn('Поставлено в очередь картинок: 1', out.getvalue())
+        job = self.thumbnail_jobs().get()
+        self.assertEqual(job.key, thumbnails.job_key(post.image.name))
+        call_command('render_thumbnails', '--all', stdout=out)
+        self.assertEqual(self.thumbnail_jobs().count(), 2)
@@ -0,0 +1,79 @@
+from array import array
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import graph
+from ..models import Follow, User
+
+
+@mock.patch('django.db.transaction.on_commit',
+            side_effect=lambda func: func())
+class SocialGraphCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(4)
+        ]
+        for author in reversed(cls.authors[:3]):
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_ids_are_sorted_and_loaded_once(self, on_commit):
+        expected = sorted(author.pk for author in self.authors[:3])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(graph.followed_ids(self.reader.pk)),
+                             expected)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                graph.is_following(self.reader.pk, self.authors[0].pk))
+            self.assertFalse(
+                graph.is_following(self.reader.pk, self.authors[3].pk))
+
+    def test_follow_views_reload_cache(self, on_commit):
+        """Подписка сдвигает поколение: массив перечитывается один раз."""
+        author = self.authors[3]
+        graph.followed_ids(self.reader.pk)
+        self.client.get(
+            reverse('posts:profile_follow', args=[author.username]))
+        with self.assertNumQueries(1):
+            self.assertTrue(graph.is_following(self.reader.pk, author.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.reader.pk, author.pk))
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[author.username]))
+        self.assertFalse(graph.is_following(self.reader.pk, author.pk))
+        self.assertEqual(
+            list(graph.followed_ids(self.reader.pk)),
+            sorted(author.pk for author in self.authors[:3]))
+
+    def test_profile_reads_state_from_cache(self, on_commit):
+        url = reverse('posts:profile', args=[self.authors[0].username])
+        response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        cache.set(graph._key(self.reader.pk), b'')
+        response = self.client.get(url)
+        self.assertFalse(response.context['following'])
+
+    def test_stale_cache_is_dropped(self, on_commit):
+        followed, other = self.authors[0], self.authors[3]
+        # Кэш думает, что подписки на followed нет, а на other — есть.
+        key = graph._key(self.reader.pk)
+        cache.set(key, array(graph.TYPECODE, [other.pk]).tobytes())
+        self.client.get(
+            reverse('posts:profile_follow', args=[followed.username]))
+        self.assertTrue(graph.is_following(self.reader.pk, followed.pk))
+        cache.set(graph._key(self.reader.pk),
+                  array(graph.TYPECODE, [other.pk]).tobytes())
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[other.username]))
+        self.assertFalse(graph.is_following(self.reader.pk, other.pk))
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 3)
@@ -0,0 +1,222 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from core import generations, jobs
+from core.models import Job
+
+from ..cache import follower_scope
+from ..models import Follow, Post, TimelineEntry, User
+from ..tasks import backfill_key, backfill_timeline, push_author, push_key
+from ..timeline import is_pulled
+
+calls = []
+
+
+@jobs.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(name='tests.broken', max_attempts=2, retry_delay=10)
+def broken():
+    raise ValueError('сломано')
+
+
+def enqueued(task, *args, **kwargs):
+    task.enqueue(*args, **kwargs)
+    return Job.objects.latest('pk')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueued_job_runs_once(self):
+        handler = mock.Mock()
+        jobs.job_finished.connect(handler)
+        self.addCleanup(jobs.job_finished.disconnect, handler)
+        job = enqueued(record, 'привет')
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, ['привет'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished)
+        handler.assert_called_once()
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_key_deduplicates_pending_jobs(self):
+        first = enqueued(record, 1, key='same')
+        record.enqueue(2, key='same')
+        self.assertEqual(Job.objects.get(), first)
+        # Взятая в работу задача уже не мешает поставить новую.
+        jobs.claim()
+        record.enqueue(3, key='same')
+        self.assertEqual(Job.objects.filter(key='same').count(), 2)
+        record.enqueue(4)
+        record.enqueue(5)
+        self.assertEqual(Job.objects.filter(key='').count(), 2)
+
+    def test_delayed_job_waits(self):
+        job = enqueued(record, 'позже', delay=60)
+        self.assertIsNone(jobs.claim())
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, ['позже'])
+
+    def test_failed_job_is_retried_then_failed(self):
+        handler = mock.Mock()
+        jobs.job_failed.connect(handler)
+        self.addCleanup(jobs.job_failed.disconnect, handler)
+        job = enqueued(broken)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('сломано', job.last_error)
+        self.assertGreater(
+            job.run_at, timezone.now() + timedelta(seconds=5))
+        handler.assert_not_called()
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        handler.assert_called_once()
+
+    def test_unknown_job_fails(self):
+        job = Job.objects.create(name='tests.missing')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = enqueued(record, 'снова')
+        jobs.claim()
+        self.assertIsNone(jobs.claim())
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 2)
+
+    def test_purge_removes_old_done_jobs(self):
+        old = enqueued(record, 'старая')
+        jobs.run_pending()
+        Job.objects.filter(pk=old.pk).update(
+            finished=timezone.now() - timedelta(days=8))
+        record.enqueue('новая')
+        self.assertEqual(jobs.purge(7), 1)
+        self.assertEqual(Job.objects.count(), 1)
+
+
+@mock.patch('posts.timeline.BACKFILL_LIMIT', 2)
+class BackfillJobTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        for number in range(5):
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+
+    def test_follow_backfills_rest_in_background(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(entries.count(), 2)
+        newest = Post.objects.order_by('-pub_date', '-id')[:2]
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {post.pk for post in newest})
+        job = Job.objects.get(name=backfill_timeline.name)
+        self.assertEqual(job.key, backfill_key(self.reader.pk, self.author.pk))
+        scope = follower_scope(self.reader.pk)
+        before = generations.version(scope)
+        jobs.run_pending()
+        self.assertEqual(entries.count(), 5)
+        # Закэшированная лента подписок больше не читается.
+        self.assertNotEqual(generations.version(scope), before)
+
+    def test_unfollow_before_job_keeps_timeline_empty(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader).delete()
+        jobs.run_pending()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(
+            Job.objects.get(name=backfill_timeline.name).status, Job.DONE)
+
+    def test_small_author_needs_no_job(self):
+        with mock.patch('posts.timeline.BACKFILL_LIMIT', 10):
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(
+            Job.objects.filter(name=backfill_timeline.name).exists())
+
+
+@mock.patch('posts.timeline.FANOUT_LIMIT', 1)
+class PushAuthorJobTest(TestCase):
+    """Автор, вернувшийся под порог, не теряет постов в лентах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(2)
+        ]
+
+    def test_posts_written_while_pulled_reach_timelines(self):
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        entries = TimelineEntry.objects.filter(post=post)
+        self.assertFalse(entries.exists())
+        Follow.objects.filter(user=self.readers[1]).delete()
+        # Пока задача не выполнена, пост подмешивается при чтении.
+        self.assertTrue(is_pulled(self.author.pk))
+        job = Job.objects.get(name=push_author.name)
+        self.assertEqual(job.key, push_key(self.author.pk))
+        jobs.run_pending()
+        self.assertFalse(is_pulled(self.author.pk))
+        self.assertEqual(
+            list(entries.values_list('user_id', flat=True)),
+            [self.readers[0].pk])
+        later = Post.objects.create(author=self.author, text='Ещё пост')
+        self.assertTrue(TimelineEntry.objects.filter(post=later).exists())
+
+    def test_author_over_limit_again_stays_pulled(self):
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.filter(user=self.readers[1]).delete()
+        Follow.objects.create(user=self.readers[1], author=self.author)
+        jobs.run_pending()
+        self.assertTrue(is_pulled(self.author.pk))
+
+
+class RunJobsCommandTest(TransactionTestCase):
+    """Потоки пула видят только зафиксированные задачи.
+
+    Тестовая база в памяти с общим кэшем блокирует таблицы целиком
+    и не ждёт busy_timeout, поэтому поток в пуле один.
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def test_workers_run_all_jobs(self):
+        for number in range(10):
+            record.enqueue(number)
+        output = StringIO()
+        call_command('run_jobs', workers=1, once=True, stdout=output)
+        self.assertIn('Выполнено задач: 10', output.getvalue())
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertEqual(
+            Job.objects.filter(status=Job.DONE).count(), 10)
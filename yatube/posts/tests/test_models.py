@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..counters import reconcile
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -29,3 +30,47 @@ class PostModelTest(TestCase):
     def test_models_have_correct_object_names1(self):
         object_group = PostModelTest.group
         self.assertEqual(object_group.title, str(object_group.title))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.reader).following_count, 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        comment.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        post.delete()
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile исправляет счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=str(i), group=self.group)
+            for i in range(3)
+        )
+        fixed = reconcile(batch_size=1)
+        self.assertEqual(fixed['authors'], 1)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 3)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 3)
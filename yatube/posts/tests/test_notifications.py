@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+from .. import notifications
+from ..models import Follow, PendingNotification, Post, User
+from ..tasks import send_digests
+
+
+class DigestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer')
+        cls.poet = User.objects.create_user(username='poet')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        cls.fan = User.objects.create_user(
+            username='fan', email='fan@example.com')
+        cls.silent = User.objects.create_user(username='silent')
+        for user in (cls.reader, cls.fan, cls.silent):
+            Follow.objects.create(user=user, author=cls.writer)
+        Follow.objects.create(user=cls.fan, author=cls.poet)
+
+    def publish(self):
+        return [
+            Post.objects.create(author=self.writer, text='Первый пост'),
+            Post.objects.create(author=self.writer, text='Второй пост'),
+            Post.objects.create(author=self.poet, text='Стихи'),
+        ]
+
+    def test_write_records_event_and_one_delayed_job(self):
+        posts = self.publish()
+        self.assertEqual(
+            set(PendingNotification.objects.values_list(
+                'post_id', flat=True)),
+            {post.pk for post in posts})
+        job = Job.objects.get(name=send_digests.name)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(minutes=5))
+        self.assertEqual(mail.outbox, [])
+
+    def test_job_sends_one_digest_per_follower(self):
+        posts = self.publish()
+        Job.objects.update(run_at=timezone.now())
+        jobs.run_pending()
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['fan@example.com', 'reader@example.com'])
+        digests = {message.to[0]: message for message in mail.outbox}
+        fan = digests['fan@example.com']
+        self.assertIn('3', fan.subject)
+        for post in posts:
+            self.assertIn(post.text, fan.body)
+            self.assertIn(f'/posts/{post.pk}/', fan.body)
+        self.assertNotIn('Стихи', digests['reader@example.com'].body)
+        self.assertFalse(PendingNotification.objects.exists())
+
+    def test_one_connection_per_batch(self):
+        self.publish()
+        with mock.patch(
+                'posts.notifications.mail.get_connection',
+                wraps=mail.get_connection) as get_connection:
+            sent, more = notifications.send_digests(batch_size=1)
+        self.assertEqual((sent, more), (2, False))
+        self.assertEqual(get_connection.call_count, 2)
+
+    def test_retry_skips_sent_batches(self):
+        """Повтор после сбоя пишет только тем, кому письмо не ушло."""
+        self.publish()
+        send_messages = locmem.EmailBackend.send_messages
+        calls = []
+
+        def flaky(backend, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise SMTPException('сбой')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', flaky):
+            with self.assertRaises(SMTPException):
+                notifications.send_digests(batch_size=1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(notifications.send_digests(batch_size=1), (1, False))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['fan@example.com', 'reader@example.com'])
+        self.assertFalse(PendingNotification.objects.exists())
+
+    def test_deleted_post_is_not_announced(self):
+        post = Post.objects.create(author=self.writer, text='Удалю')
+        post.delete()
+        self.assertEqual(notifications.send_digests(), (0, False))
+        self.assertEqual(mail.outbox, [])
+
+    def test_rest_of_events_go_to_next_run(self):
+        self.publish()
+        Job.objects.update(run_at=timezone.now())
+        with mock.patch('posts.notifications.EVENTS_PER_RUN', 2):
+            # Остаток подхватывает задача, поставленная без задержки.
+            self.assertEqual(jobs.run_pending(), 2)
+        self.assertFalse(PendingNotification.objects.exists())
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_command(self):
+        self.publish()
+        output = StringIO()
+        call_command('send_digests', stdout=output)
+        self.assertIn('Отправлено писем: 2', output.getvalue())
+
+    def test_file_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.publish()
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.filebased.'
+                              'EmailBackend',
+                EMAIL_FILE_PATH=directory):
+            notifications.send_digests()
+        # Файловый бэкенд пишет в один файл на подключение.
+        [name] = os.listdir(directory)
+        with open(os.path.join(directory, name)) as log:
+            content = log.read()
+        self.assertIn('To: fan@example.com', content)
+        self.assertIn('To: reader@example.com', content)
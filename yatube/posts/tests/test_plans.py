@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.plans import PlanRecorder, explain, problems
+
+from ..benchmark import Benchmark
+from ..models import Follow, Post
+from ..paginators import CursorPaginator
+
+# Запросы, которым полный просмотр или сортировка простительны:
+# начало SQL -> причина.
+ALLOWED = {
+    # bm25 считается по найденным строкам, индекса по нему нет.
+    'SELECT rowid, bm25(': 'ранжирование FTS5',
+    # Проверка наличия FTS5, один раз на процесс.
+    'SELECT name, type FROM sqlite_master': 'интроспекция',
+    # Выпадающий список групп в форме поста — вся таблица по смыслу.
+    'SELECT "posts_group"."id", "posts_group"."title", '
+    '"posts_group"."slug", "posts_group"."description", '
+    '"posts_group"."posts_count" FROM "posts_group"': 'выбор группы',
+}
+
+
+@override_settings(THUMBNAIL_WORKERS=0, QUERY_BUDGET_MODE='off')
+class QueryPlanTest(TestCase):
+    """Главные запросы всех страниц идут по индексам, без сортировок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', users=10, groups=2, posts=60, follows=4,
+            comments=80, images=0, batch_size=50, seed=1, stdout=StringIO())
+        cls.reader = Follow.objects.first().user
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+
+    def urls(self):
+        benchmark = Benchmark(username=self.reader.username)
+        urls = [url for _, url in benchmark.targets()]
+        post = Post.objects.order_by('-comments_count').first()
+        urls += [
+            reverse('api:post_list'),
+            reverse('api:post_detail', args=[post.pk]),
+            reverse('api:group_posts', args=[post.group.slug]),
+            reverse('api:user_posts', args=[post.author.username]),
+        ]
+        return urls
+
+    @staticmethod
+    def neighbours(url, response):
+        """Ссылки на следующую и предыдущую страницы ответа."""
+        if response['Content-Type'] == 'application/json':
+            data = response.json()
+            return [
+                data[key] for key in ('next', 'previous') if data.get(key)]
+        page = (response.context or {}).get('page_obj') or (
+            (response.context or {}).get('comments'))
+        if page is None:
+            return []
+        separator = '&' if '?' in url else '?'
+        return [
+            f'{url}{separator}{direction}={cursor}'
+            for direction, cursor in (
+                ('after', page.next_cursor),
+                ('before', page.previous_cursor),
+            )
+            if cursor
+        ]
+
+    def test_views_use_indexes(self):
+        client = Client()
+        client.force_login(self.reader)
+        recorder = PlanRecorder()
+        urls, visited = self.urls(), []
+        with recorder.record():
+            for url in urls:
+                response = client.get(url)
+                # Вторая страница и возврат с неё: запросы с курсором.
+                for neighbour in self.neighbours(url, response):
+                    page = client.get(neighbour)
+                    visited.append(neighbour)
+                    for back in self.neighbours(url, page):
+                        client.get(back)
+                        visited.append(back)
+        self.assertTrue(any('after=' in url for url in visited))
+        self.assertTrue(any('before=' in url for url in visited))
+        checked = set()
+        for alias, sql, params in recorder.queries:
+            if sql in checked or sql.startswith(tuple(ALLOWED)):
+                continue
+            checked.add(sql)
+            with self.subTest(sql=sql):
+                plan = explain(sql, params, alias)
+                self.assertEqual(problems(plan), [], plan)
+
+    def test_seek_uses_index_range(self):
+        """Страница после курсора начинается с поиска по индексу."""
+        post = Post.objects.order_by('-pub_date', '-id')[20]
+        paginators = (
+            CursorPaginator(Post.objects.all(), 10),
+            CursorPaginator(Post.objects.filter(author=post.author), 10),
+            CursorPaginator(Post.objects.filter(group=post.group), 10),
+        )
+        for paginator in paginators:
+            for forward in (True, False):
+                with self.subTest(
+                        sql=str(paginator.object_list.query), forward=forward):
+                    ordering = paginator.ordering if forward else map(
+                        paginator._reverse, paginator.ordering)
+                    queryset = paginator.object_list.filter(
+                        paginator._seek([post.pub_date, post.pk], forward)
+                    ).order_by(*ordering)[:11]
+                    plan = explain(*queryset.query.sql_with_params())
+                    self.assertTrue(plan[0].startswith('SEARCH'), plan)
+                    self.assertEqual(problems(plan), [], plan)
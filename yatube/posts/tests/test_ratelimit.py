@@ -0,0 +1,107 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.ratelimit import WriteLoad, take_token
+
+from ..models import Comment, Post, User
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_empties_and_refills(self):
+        now = time.time()
+        for _ in range(3):
+            self.assertEqual(take_token('test:1', '3/m', now), 0)
+        wait = take_token('test:1', '3/m', now)
+        self.assertAlmostEqual(wait, 20)
+        # Другой клиент со своим ведром.
+        self.assertEqual(take_token('test:2', '3/m', now), 0)
+        self.assertEqual(take_token('test:1', '3/m', now + 20), 0)
+        self.assertGreater(take_token('test:1', '3/m', now + 20), 0)
+
+
+@mock.patch('core.ratelimit.write_load', new_callable=WriteLoad)
+class WriteLimitTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.comment_url = reverse('posts:add_comment', args=[self.post.pk])
+
+    @override_settings(RATE_LIMITS={'add_comment': '2/m'})
+    def test_user_is_limited_per_view(self, write_load):
+        for _ in range(2):
+            response = self.client.post(self.comment_url, {'text': 'Да'})
+            self.assertEqual(response.status_code, 302)
+        response = self.client.post(self.comment_url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
+        other = Client()
+        other.force_login(self.other)
+        response = other.post(self.comment_url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RATE_LIMITS={'post_create': '1/m'})
+    def test_only_writing_methods_are_limited(self, write_load):
+        url = reverse('posts:post_create')
+        self.client.post(url, {'text': 'Первый'})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(
+            self.client.post(url, {'text': 'Второй'}).status_code, 429)
+
+    @override_settings(RATE_LIMITS={'add_comment': None})
+    def test_limit_can_be_disabled(self, write_load):
+        with mock.patch('core.ratelimit.take_token') as take:
+            self.client.post(self.comment_url, {'text': 'Да'})
+        take.assert_not_called()
+
+    @override_settings(RATE_LIMITS={'signup': '1/h'})
+    def test_signup_is_limited_by_ip(self, write_load):
+        url = reverse('users:signup')
+        data = {
+            'username': 'newcomer', 'email': 'new@example.com',
+            'password1': 'Very-secret-1', 'password2': 'Very-secret-1',
+        }
+        self.assertEqual(Client().post(url, data).status_code, 302)
+        data['username'] = 'another'
+        self.assertEqual(Client().post(url, data).status_code, 429)
+        self.assertEqual(
+            Client(REMOTE_ADDR='10.0.0.2').post(url, data).status_code, 302)
+
+    @override_settings(WRITE_SHED_QUEUE=2)
+    def test_queue_depth_sheds_writes_without_orm(self, write_load):
+        write_load.in_flight = 2
+        with self.assertNumQueries(0):
+            response = self.client.post(self.comment_url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        self.assertEqual(self.client.get(reverse('posts:index')).status_code,
+                         200)
+
+    @override_settings(WRITE_SHED_LATENCY=1.0)
+    def test_slow_writes_shed_until_average_decays(self, write_load):
+        now = time.monotonic()
+        write_load.average, write_load.measured = 3.0, now
+        self.assertTrue(write_load.overloaded())
+        response = self.client.post(self.comment_url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 429)
+        write_load.measured = now - 30
+        self.assertFalse(write_load.overloaded())
+        response = self.client.post(self.comment_url, {'text': 'Да'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(write_load.in_flight, 0)
+        self.assertLess(write_load.latency(), 1.0)
@@ -0,0 +1,141 @@
+import time
+from functools import partial
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.replicas import PRIMARY, STICKY_COOKIE, ReplicaRouter
+
+from ..models import Group, Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], PAGE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTest(TestCase):
+    """Чтения страниц идут на реплику, запись и «свои» чтения — в primary.
+
+    Реплики в тестах нет, поэтому роутер подменяем: запоминаем, куда
+    он отправил бы чтение, а читаем всё равно из primary.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='replica', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост', group=cls.group)
+
+    def setUp(self):
+        # Вёдра ограничения частоты живут в кэше и переживают тесты.
+        cache.clear()
+        self.reads = []
+        self.route = route = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            self.reads.append(route(router, model, **hints))
+            return PRIMARY
+
+        patcher = mock.patch.object(ReplicaRouter, 'db_for_read', spy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def read_databases(self, url):
+        self.reads.clear()
+        self.client.get(url)
+        return set(self.reads)
+
+    def test_read_only_views_use_replica(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+            reverse('api:post_list'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.read_databases(url), {'replica'})
+
+    def test_search_reads_index_from_replica(self):
+        """Сырой SQL поиска по FTS5 тоже читает с реплики."""
+        aliases = []
+
+        def connection(alias):
+            aliases.append(alias)
+            return connections[PRIMARY]
+
+        # Спай класса отвечает primary; здесь берём настоящий ответ.
+        with mock.patch('posts.search.router') as router, \
+                mock.patch('posts.search.connections') as spy:
+            router.db_for_read.side_effect = partial(
+                self.route, ReplicaRouter())
+            spy.__getitem__.side_effect = connection
+            self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertEqual(aliases, ['replica'])
+
+    def test_other_views_use_primary(self):
+        url = reverse('posts:post_create')
+        self.assertEqual(self.read_databases(url), {PRIMARY})
+
+    def test_write_makes_client_sticky(self):
+        """После записи свои чтения идут в primary, пока не истечёт окно."""
+        url = reverse('posts:index')
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.read_databases(url), {PRIMARY})
+        self.client.cookies[STICKY_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.read_databases(url), {'replica'})
+
+    def test_follow_by_get_makes_client_sticky(self):
+        """Подписка — запись, хоть и по GET."""
+        author = User.objects.create_user(username='author')
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[author.username]))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_read_does_not_make_client_sticky(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    @staticmethod
+    def cached(prefix):
+        """Живые ключи кэша (LocMemCache хранит их как ':1:ключ')."""
+        keys = [key.split(':', 2)[2] for key in list(cache._cache)]
+        return [
+            key for key in keys
+            if key.startswith(prefix) and cache.has_key(key)
+        ]
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_replica_reads_do_not_fill_caches(self):
+        """Страница с реплики не попадает в кэши и идёт без ETag."""
+        guest = Client()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertNotIn('ETag', guest.get(url))
+                self.assertNotIn('X-Page-Cache', guest.get(url))
+                self.assertEqual(self.cached('template.cache.'), [])
+                self.assertEqual(self.cached('card:'), [])
+        # Массив подписок, прочитанный с реплики, тоже не сохраняется.
+        self.client.get(urls[2])
+        self.assertEqual(self.cached('following:'), [])
+
+    def test_router_outside_request(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), PRIMARY)
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate(PRIMARY, 'posts'))
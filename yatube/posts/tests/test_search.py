@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..paginators import encode_cursor
+from ..search import InvertedIndexBackend, fts5_available, rebuild
+from ..stemmer import stem, terms
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова дают одну основу."""
+        forms = (
+            ('кораллы', 'коралл'),
+            ('украли', 'украл'),
+            ('новости', 'новость'),
+            ('книги', 'книгой'),
+        )
+        for first, second in forms:
+            with self.subTest(word=first):
+                self.assertEqual(stem(first), stem(second))
+
+    def test_terms_lowercase_and_yo(self):
+        self.assertEqual(terms('Ёжики, ЁЖИК!'), [stem('ежики'), 'ежик'])
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Карл у Клары украл кораллы')
+        Post.objects.create(author=cls.user, text='Клара у Карла украла')
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'Новость номер {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        return self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+
+    def test_search_uses_fts5(self):
+        self.assertTrue(fts5_available())
+
+    def test_search_finds_word_forms(self):
+        """Поиск находит пост по другой форме слова."""
+        response = self.search('коралл')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    def test_search_requires_all_words(self):
+        response = self.search('карл кораллов')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertEqual(len(self.search('украла').context['page_obj']), 2)
+
+    def test_search_cursor_pagination(self):
+        """Результаты поиска листаются курсором без повторов."""
+        first_page = self.search('новости').context['page_obj']
+        second_page = self.search(
+            'новости', after=first_page.next_cursor).context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(set(first_page) & set(second_page))
+
+    def test_forged_cursor_returns_first_page(self):
+        for values in (['abc', 1], [1.5, None], [1.5, 10 ** 30]):
+            with self.subTest(values=values):
+                page = self.search(
+                    'новости', after=encode_cursor(values)
+                ).context['page_obj']
+                self.assertEqual(len(page), 10)
+
+    def test_deleted_post_leaves_index(self):
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertEqual(len(self.search('коралл').context['page_obj']), 0)
+
+    def test_inverted_index_fallback(self):
+        """Обратный индекс ищет так же, как FTS5."""
+        backend = InvertedIndexBackend()
+        backend.index(Post.objects.values_list('id', 'text'))
+        hits = backend.search(sorted(set(terms('кораллы'))))
+        self.assertEqual([pk for pk, _ in hits], [self.post.pk])
+        self.assertEqual(
+            len(backend.search([stem('новость')], limit=20)), 12)
+
+    def test_rebuild_indexes_all_posts(self):
+        self.assertEqual(rebuild(batch_size=5), Post.objects.count())
+        self.assertEqual(len(self.search('коралл').context['page_obj']), 1)
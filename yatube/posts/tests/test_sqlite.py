@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.sqlite import LOCK_RETRIES, apply_pragmas, retry_on_locked
+
+from .. import images, thumbnails
+from ..models import Post, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C\x0A\x00\x3B'
+)
+
+
+def pragma(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+class PragmaTest(TransactionTestCase):
+    """synchronous нельзя менять внутри транзакции теста."""
+
+    def setUp(self):
+        saved = {
+            name: pragma(name)
+            for name in (
+                'busy_timeout', 'cache_size', 'synchronous', 'temp_store')
+        }
+
+        def restore():
+            with connection.cursor() as cursor:
+                for name, value in saved.items():
+                    cursor.execute(f'PRAGMA {name} = {value}')
+
+        self.addCleanup(restore)
+
+    @override_settings(SQLITE_PRODUCTION=True)
+    def test_production_pragmas(self):
+        apply_pragmas(None, connection)
+        self.assertEqual(pragma('busy_timeout'), 5000)
+        self.assertEqual(pragma('cache_size'), -64 * 1024)
+        self.assertEqual(pragma('synchronous'), 1)
+
+    @override_settings(SQLITE_PRODUCTION=False)
+    def test_stock_mode_leaves_connection_alone(self):
+        before = pragma('busy_timeout')
+        apply_pragmas(None, connection)
+        self.assertEqual(pragma('busy_timeout'), before)
+
+    def test_maintenance_command(self):
+        output = StringIO()
+        call_command('sqlite_maintenance', stdout=output)
+        self.assertIn('WAL', output.getvalue())
+        self.assertIn('ANALYZE', output.getvalue())
+
+
+@mock.patch('core.sqlite.time.sleep')
+class RetryOnLockedTest(TransactionTestCase):
+    """Повторы нужны вне транзакции теста, отсюда TransactionTestCase."""
+
+    def setUp(self):
+        self.request = RequestFactory().post('/')
+        self.calls = 0
+
+    def locked_view(self, failures):
+        @retry_on_locked
+        def view(request):
+            self.calls += 1
+            if self.calls <= failures:
+                raise OperationalError('database is locked')
+            return HttpResponse('ok')
+        return view
+
+    def test_retries_until_lock_is_free(self, sleep):
+        with self.assertLogs('core.sqlite', 'WARNING'):
+            response = self.locked_view(failures=2)(self.request)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_transaction_takes_write_lock_first(self, sleep):
+        with CaptureQueriesContext(connection) as queries:
+            self.locked_view(failures=0)(self.request)
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_gives_up_after_retries(self, sleep):
+        with self.assertRaises(OperationalError), \
+                self.assertLogs('core.sqlite', 'WARNING'):
+            self.locked_view(failures=LOCK_RETRIES + 1)(self.request)
+        self.assertEqual(self.calls, LOCK_RETRIES + 1)
+
+    def test_reading_methods_skip_transaction(self, sleep):
+        """GET формы не берёт блокировку на запись."""
+        in_transaction = []
+
+        @retry_on_locked(methods=('POST',))
+        def view(request):
+            in_transaction.append(connection.in_atomic_block)
+            return HttpResponse('ok')
+
+        with CaptureQueriesContext(connection) as queries:
+            view(RequestFactory().get('/'))
+        self.assertEqual(len(queries), 0)
+        with CaptureQueriesContext(connection) as queries:
+            view(self.request)
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertEqual(in_transaction, [False, True])
+
+    def test_other_errors_are_not_retried(self, sleep):
+        @retry_on_locked
+        def view(request):
+            self.calls += 1
+            raise OperationalError('no such table: missing')
+
+        with self.assertRaises(OperationalError):
+            view(self.request)
+        self.assertEqual(self.calls, 1)
+
+    def test_committed_transaction_is_not_retried(self, sleep):
+        """Запись уже зафиксирована: повтор продублировал бы её."""
+        def fail():
+            raise OperationalError('database is locked')
+
+        @retry_on_locked
+        def view(request):
+            self.calls += 1
+            transaction.on_commit(fail)
+            return HttpResponse('ok')
+
+        with self.assertRaises(OperationalError):
+            view(self.request)
+        self.assertEqual(self.calls, 1)
+
+
+@override_settings(QUERY_BUDGET_MODE='off')
+@mock.patch('core.sqlite.time.sleep')
+class PostWriteLockTest(TransactionTestCase):
+    """Картинка обрабатывается до блокировки, под ней только запись."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'С картинкой',
+            'image': SimpleUploadedFile(
+                'photo.gif', SMALL_GIF, content_type='image/gif'),
+        })
+
+    def test_image_normalized_outside_transaction(self, sleep):
+        in_transaction = []
+        normalize = images.normalize
+
+        def spy(file_):
+            in_transaction.append(connection.in_atomic_block)
+            return normalize(file_)
+
+        with mock.patch('posts.forms.images.normalize', spy):
+            self.create_post()
+        self.assertEqual(in_transaction, [False])
+        self.assertTrue(Post.objects.filter(text='С картинкой').exists())
+
+    def test_retry_saves_image_once(self, sleep):
+        """Повтор записи не кладёт картинку в хранилище второй раз."""
+        schedule = thumbnails.schedule
+        with mock.patch(
+            'posts.views.thumbnails.schedule',
+            side_effect=[OperationalError('database is locked'), schedule],
+        ), self.assertLogs('core.sqlite', 'WARNING'):
+            self.create_post()
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual(post.image.name, 'posts/photo.gif')
+        self.assertEqual(
+            os.listdir(os.path.join(self.media_root, 'posts')),
+            ['photo.gif'])
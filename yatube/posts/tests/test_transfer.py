@@ -0,0 +1,133 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from ..transfer import Importer
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='transfer', description='Описание')
+        for number in range(7):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}',
+                group=cls.group if number % 2 else None)
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.path = os.path.join(TEMP_DIR, f'{self._testMethodName}.ndjson')
+        call_command('export_data', output=self.path, stdout=StringIO())
+
+    def test_import_does_not_need_seeding_dependencies(self):
+        """Импорт работает без Faker и mixer, нужных только генератору."""
+        with mock.patch.dict(sys.modules, {'faker': None, 'mixer': None}):
+            for name in ('posts.transfer', 'posts.derived', 'posts.seeding'):
+                sys.modules.pop(name, None)
+            importlib.import_module('posts.transfer')
+
+    def snapshot(self):
+        return (
+            list(Group.objects.order_by('pk').values_list('pk', 'slug')),
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group_id')),
+            list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'text', 'created')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def clear(self):
+        Group.objects.all().delete()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+
+    def test_export_is_ndjson(self):
+        with open(self.path, encoding='utf-8') as file_:
+            lines = file_.read().splitlines()
+        self.assertEqual(len(lines), 1 + 7 + 7 + 1)
+        self.assertIn('"model": "posts.group"', lines[0])
+        self.assertIn('"author": "writer"', lines[1])
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка возвращают те же строки."""
+        expected = self.snapshot()
+        self.clear()
+        call_command(
+            'import_data', self.path, batch_size=3, stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_resume_after_failure(self):
+        """Прерванная загрузка продолжается с последней пачки."""
+        expected = self.snapshot()
+        self.clear()
+        flush = Importer.flush
+        calls = []
+
+        def failing_flush(importer, label, records, offset):
+            calls.append(label)
+            if len(calls) == 3:
+                raise RuntimeError('сбой')
+            flush(importer, label, records, offset)
+
+        with mock.patch.object(Importer, 'flush', failing_flush):
+            with self.assertRaises(RuntimeError):
+                Importer(self.path, batch_size=3).run()
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertTrue(os.path.exists(f'{self.path}.checkpoint'))
+        created, _ = Importer(self.path, batch_size=3).run()
+        self.assertEqual(created['posts.group'], 0)
+        self.assertEqual(created['posts.post'], 4)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_rerun_skips_existing_rows(self):
+        """Повторная загрузка не дублирует строки."""
+        expected = self.snapshot()
+        created, skipped = Importer(self.path).run()
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(set(created.values()), {0})
+        self.assertEqual(skipped['posts.post'], 7)
+
+    def test_foreign_rows_with_same_keys_refuse_import(self):
+        """Занятые чужими строками ключи — отказ до любой записи."""
+        post_pks = list(Post.objects.values_list('pk', flat=True))
+        self.clear()
+        Post.objects.create(
+            pk=post_pks[-1], author=self.reader, text='Чужой пост')
+        with self.assertRaisesMessage(CommandError, str(post_pks[-1])):
+            call_command('import_data', self.path, stdout=StringIO())
+        self.assertEqual(Group.objects.count(), 0)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Чужой пост'])
+
+    def test_unknown_user_is_skipped(self):
+        self.clear()
+        User.objects.filter(username='reader').delete()
+        created, skipped = Importer(self.path).run()
+        self.assertEqual(skipped['posts.comment'], 7)
+        self.assertEqual(skipped['posts.follow'], 1)
+        self.assertEqual(created['posts.post'], 7)
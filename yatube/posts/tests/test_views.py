@@ -1,11 +1,22 @@
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.queries import RAISE, QueryBudgetExceeded
+from core.testing import QueryBudgetMixin
+
+from .. import live, timeline
 from ..forms import PostForm
-from ..models import Follow, Group, Post, User, Comment
+from ..models import Follow, Group, Post, User, Comment, TimelineEntry
+from ..paginators import encode_cursor
+from ..views import COUNT_OF_COMMENTS, comment_paginator
 
 TEST_OF_POST = 13
 User = get_user_model()
@@ -148,20 +159,35 @@ class PostPagesTests(TestCase):
         self.assertNotContains(response, coments['text'])
 
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
+        """Лента index берётся из кэша, пока не изменился ни один пост."""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
+        Post.objects.filter(pk=self.post.pk).update(text='мимо сигналов')
+        response_old = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_old.content, posts)
         Post.objects.create(
             text='новый пост',
             author=self.post.author,
         )
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
-        new_posts = response_new.content
-        self.assertNotEqual(old_posts, new_posts)
+        self.assertNotEqual(response_new.content, posts)
+        self.assertContains(response_new, 'новый пост')
+
+    def test_cache_group_and_profile_follow_post_changes(self):
+        """Изменение поста сразу видно в ленте группы и профиле."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Исправленный пост')
 
 
 class PaginatorViewsTest(TestCase):
@@ -187,9 +213,14 @@ class PaginatorViewsTest(TestCase):
         response = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 10)
 
+    def get_second_page(self, url):
+        response = self.guest_client.get(url)
+        next_cursor = response.context['page_obj'].next_cursor
+        return self.guest_client.get(url, {'after': next_cursor})
+
     def test_second_index_page_contains_three_records(self):
         """Количество постов на второй странице ровно 3"""
-        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        response = self.get_second_page(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 3)
 
     def test_first_group_page_contains_ten_records(self):
@@ -200,9 +231,8 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_group_page_contains_three_records(self):
         """Количество постов на второй странице ровно 3"""
-        url = reverse(
-            'posts:group_list', kwargs={'slug': self.group.slug}) + '?page=2'
-        response = self.guest_client.get(url)
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.get_second_page(url)
         self.assertEqual(len(response.context['page_obj']), 3)
 
     def test_first_profile_page_contains_ten_records(self):
@@ -213,12 +243,52 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_profile_page_contains_three_records(self):
         """Количество постов на второй странице ровно 3"""
-        url = reverse(
-            'posts:profile',
-            kwargs={'username': self.user.username}) + '?page=2'
-        response = self.guest_client.get(url)
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        response = self.get_second_page(url)
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_do_not_overlap(self):
+        """Страницы по курсору не пересекаются и ведут обратно"""
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context['page_obj']
+        second_page = self.guest_client.get(
+            url, {'after': first_page.next_cursor}).context['page_obj']
+        self.assertFalse(set(first_page) & set(second_page))
+        self.assertFalse(second_page.has_next())
+        response = self.guest_client.get(
+            url, {'before': second_page.previous_cursor})
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_forged_cursor_values_return_first_page(self):
+        """Курсор с чужими значениями внутри — тоже первая страница"""
+        post = Post.objects.first()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_comments', args=[post.pk]),
+            reverse('api:post_list'),
+        )
+        forged = (
+            ['abc', 1], [{'x': 1}, 1], [None, None],
+            ['2020-01-01T00:00:00+00:00', 'x'],
+            ['2020-01-01T00:00:00+00:00', 10 ** 30],
+        )
+        for url in urls:
+            for values in forged:
+                with self.subTest(url=url, values=values):
+                    response = self.guest_client.get(
+                        url, {'after': encode_cursor(values)})
+                    self.assertEqual(response.status_code, 200)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -279,3 +349,494 @@ class FollowViewsTest(TestCase):
                                    text="Подпишись на меня")
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        Follow.objects.create(user=self.follower1, author=self.follower2)
+        post = Post.objects.create(author=self.follower2, text='Новый')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower1, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower3, post=post).exists())
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора уходят из ленты."""
+        Post.objects.create(author=self.follower2, text='Пост')
+        Follow.objects.create(user=self.follower1, author=self.follower2)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.follower2.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower1).exists())
+
+    def test_failed_rebuild_keeps_timelines(self):
+        """Сбой пересборки не оставляет ленты пустыми."""
+        Follow.objects.create(user=self.follower1, author=self.follower2)
+        post = Post.objects.create(author=self.follower2, text='Пост')
+        # Падаем после удаления старых записей.
+        with mock.patch('posts.timeline.AuthorStats.objects.update',
+                        side_effect=RuntimeError('сбой')):
+            with self.assertRaises(RuntimeError):
+                timeline.rebuild()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower1, post=post).exists())
+        self.assertEqual(timeline.rebuild(), 1)
+
+    def test_rebuild_in_batches(self):
+        """Подписчики читаются пачками по ключу, ленты собираются все."""
+        post = Post.objects.create(author=self.follower2, text='Пост')
+        for follower in (self.follower1, self.follower3):
+            Follow.objects.create(user=follower, author=self.follower2)
+        Follow.objects.create(user=self.follower3, author=self.follower1)
+        TimelineEntry.objects.all().delete()
+        self.assertEqual(timeline.rebuild(batch_size=1), 2)
+        for follower in (self.follower1, self.follower3):
+            with self.subTest(follower=follower.username):
+                self.assertTrue(TimelineEntry.objects.filter(
+                    user=follower, post=post).exists())
+
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        with mock.patch('posts.timeline.FANOUT_LIMIT', 0):
+            Follow.objects.create(user=self.follower1, author=self.follower2)
+            post = Post.objects.create(author=self.follower2, text='Звезда')
+            response = self.authorized_client.get(
+                reverse('posts:follow_index'))
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commentator')
+        cls.group = Group.objects.create(
+            title='Группа', slug='comments', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Обсуждаемый пост', group=cls.group)
+        for number in range(COUNT_OF_COMMENTS + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_page_in_one_query(self):
+        """Пост и первая порция комментариев читаются одним запросом.
+
+        Второй запрос — автор и группа поста для ETag.
+        """
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COUNT_OF_COMMENTS)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertEqual(response.context['post'].group, self.group)
+        self.assertContains(response, 'js-more-comments')
+
+    def test_load_more_fragment(self):
+        """Фрагмент отдаёт оставшиеся комментарии без кнопки «ещё»."""
+        first = comment_paginator(self.post.pk).get_page()
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': first.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertContains(response, 'Комментарий 24')
+        self.assertNotContains(response, 'Комментарий 19<')
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_load_more_json(self):
+        """С ?format=json отдаётся порция в JSON и курсор следующей."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['comments']), COUNT_OF_COMMENTS)
+        self.assertEqual(data['comments'][0]['author'], 'commentator')
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'format': 'json', 'after': data['next']})
+        self.assertEqual(len(response.json()['comments']), 5)
+        self.assertIsNone(response.json()['next'])
+
+    def test_unknown_post(self):
+        """Для несуществующего поста — 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Закрепляем число SQL-запросов каждого view."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+        for number in range(COUNT_OF_COMMENTS):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group)
+            Comment.objects.create(
+                post=post, author=cls.user, text='Комментарий')
+        cls.post = post
+        cls.own_post = Post.objects.create(author=cls.user, text='Свой')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_guest_pages(self):
+        pages = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_list', args=[self.group.slug]): 3,
+            reverse('posts:profile', args=[self.author.username]): 3,
+            reverse('posts:post_detail', args=[self.post.pk]): 2,
+            reverse('posts:post_comments', args=[self.post.pk]): 1,
+            reverse('posts:search') + '?q=пост': 2,
+        }
+        for url, expected in pages.items():
+            with self.subTest(url=url):
+                self.assertQueryCount(self.guest_client.get(url), expected)
+
+    def test_authorized_pages(self):
+        # Сессия и пользователь добавляют по запросу.
+        pages = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', args=[self.group.slug]): 5,
+            reverse('posts:profile', args=[self.author.username]): 6,
+            reverse('posts:post_detail', args=[self.post.pk]): 4,
+            reverse('posts:post_detail', args=[self.own_post.pk]): 5,
+            reverse('posts:follow_index'): 4,
+            reverse('posts:post_create'): 3,
+            reverse('posts:post_edit', args=[self.own_post.pk]): 4,
+        }
+        for url, expected in pages.items():
+            with self.subTest(url=url):
+                self.assertQueryCount(
+                    self.authorized_client.get(url), expected)
+
+    def test_feed_fragment_cache_hit(self):
+        """Из кэша фрагментов лента не читает посты."""
+        url = reverse('posts:follow_index')
+        self.authorized_client.get(url)
+        self.assertQueryCount(self.authorized_client.get(url), 3)
+
+    def test_writes(self):
+        with mock.patch('django.db.transaction.on_commit',
+                        side_effect=lambda func: func()):
+            response = self.authorized_client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'group': self.group.pk})
+            self.assertQueryCount(response, 14)
+            response = self.authorized_client.post(
+                reverse('posts:post_edit', args=[self.own_post.pk]),
+                {'text': 'Исправленный пост'})
+            self.assertQueryCount(response, 9)
+            response = self.authorized_client.post(
+                reverse('posts:add_comment', args=[self.post.pk]),
+                {'text': 'Ещё комментарий'})
+            self.assertQueryCount(response, 7)
+            response = self.authorized_client.get(
+                reverse('posts:profile_unfollow', args=[self.author]))
+            self.assertQueryCount(response, 9)
+            response = self.authorized_client.get(
+                reverse('posts:profile_follow', args=[self.author]))
+            self.assertQueryCount(response, 13)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_budget_exceeded(self):
+        """Превышение бюджета в режиме raise роняет запрос."""
+        with mock.patch('posts.views.index.query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest_client.get(reverse('posts:index'))
+
+    def test_budget_raises_in_tests(self):
+        """Тесты сами включают raise: и manage.py test, и pytest."""
+        self.assertEqual(settings.QUERY_BUDGET_MODE, RAISE)
+        with mock.patch('posts.views.index.query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest_client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGET_MODE='warn')
+    def test_budget_exceeded_on_site_only_warns(self):
+        """Вне тестов превышение бюджета пишется в лог, ответ уходит."""
+        with mock.patch('posts.views.index.query_budget', 0), \
+                self.assertLogs('core.queries', 'WARNING'):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_fan_out_is_outside_budget(self):
+        """Раскладка по лентам не растит число запросов post_create."""
+        url = reverse('posts:post_create')
+        alone = self.authorized_client.post(url, {'text': 'Без подписчиков'})
+        for number in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan{number}'),
+                author=self.user)
+        with mock.patch('posts.timeline.BATCH_SIZE', 1):
+            response = self.authorized_client.post(url, {'text': 'Для всех'})
+        self.assertQueryCount(
+            response, alone.wsgi_request.query_stats.count)
+        self.assertEqual(response.wsgi_request.query_stats.outside, 4)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cached', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост в кэше', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_anonymous_page_is_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша страниц."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertNotIn('X-Page-Cache', self.guest_client.get(url))
+        self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_hit_keeps_headers(self):
+        """Попадание в кэш отдаёт заголовки защиты, как и сама страница."""
+        url = reverse('posts:index')
+        miss = self.guest_client.get(url)
+        hit = self.guest_client.get(url)
+        self.assertEqual(hit['X-Page-Cache'], 'hit')
+        for header in ('X-Frame-Options', 'Content-Type', 'ETag'):
+            with self.subTest(header=header):
+                self.assertEqual(hit[header], miss[header])
+
+    def test_comment_purges_post_page(self):
+        """Новый комментарий сбрасывает страницу поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий')
+        response = self.guest_client.get(url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_group_change_purges_group_page(self):
+        """Изменение группы сбрасывает её страницу."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.guest_client.get(url), 'Новое название')
+
+    def test_authorized_user_is_not_cached(self):
+        """Запросы с cookies мимо кэша страниц."""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'))
+        self.assertNotIn('X-Page-Cache', client.get(reverse('posts:index')))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост с ETag', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_not_modified_without_rendering(self):
+        """С тем же ETag страница не рендерится: ответ 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.authorized_client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_304_skips_page_query(self):
+        """Для 304 хватает сессии, пользователя и поиска группы."""
+        url = self.urls[1]
+        etag = self.authorized_client.get(url)['ETag']
+        with self.assertNumQueries(3):
+            self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост в группе меняет ETag всех её страниц."""
+        etags = [self.guest_client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        url = self.urls[-1]
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_changes_follower_profile(self):
+        """Подписка меняет счётчик подписок в профиле подписчика."""
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        etag = self.guest_client.get(url)['ETag']
+        author = User.objects.create_user(username='followed')
+        Follow.objects.create(user=self.user, author=author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertEqual(
+            response.context['author'].stats.following_count, 1)
+        etag = response['ETag']
+        Follow.objects.filter(user=self.user).delete()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Гость и пользователь видят разные страницы и ETag."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.guest_client.get(url)['ETag'],
+                    self.authorized_client.get(url)['ETag'])
+
+    def test_page_cache_hit_not_modified(self):
+        """Попадание в кэш страниц тоже отвечает 304."""
+        url = self.urls[0]
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_missing_page_is_not_found(self):
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+class LivePostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='live', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Старый пост', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.notifier = live.Notifier()
+        patcher = mock.patch.object(live, 'notifier', self.notifier)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def poll(self, feed='index', key='', timeout=0, since=None):
+        return self.client.get(reverse('posts:live_posts'), {
+            'feed': feed, 'key': key, 'timeout': timeout,
+            'since': self.post.pk if since is None else since,
+        })
+
+    def test_returns_newer_posts_at_once(self):
+        new = Post.objects.create(
+            author=self.author, text='Свежий пост', group=self.group)
+        feeds = (
+            ('index', ''), ('group', self.group.slug),
+            ('profile', self.author.username), ('follow', ''),
+        )
+        for feed, key in feeds:
+            with self.subTest(feed=feed):
+                data = self.poll(feed, key).json()
+                self.assertEqual(data['count'], 1)
+                self.assertEqual(data['newest'], new.pk)
+                self.assertIn('Свежий пост', data['html'])
+                self.assertNotIn('Старый пост', data['html'])
+
+    def test_timeout_without_new_posts(self):
+        data = self.poll(timeout=0.05).json()
+        self.assertEqual(data, {
+            'count': 0, 'newest': self.post.pk, 'html': '\n'})
+
+    def test_other_feed_does_not_wake(self):
+        """Пост чужой группы не будит ожидающих ленты группы."""
+        other = User.objects.create_user(username='other')
+        self.notifier.publish(Post(pk=10 ** 6, author=other))
+        started = time.monotonic()
+        data = self.poll('group', self.group.slug, timeout=0.2).json()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(data['count'], 0)
+
+    # Пост создаётся внутри запроса: его запросы не в бюджете view.
+    @override_settings(QUERY_BUDGET_MODE='off')
+    def test_wakes_up_on_new_post(self):
+        """Ожидающий запрос отвечает, как только пост создан."""
+        wait = self.notifier.wait
+        created = []
+
+        def create_while_waiting(after, matches, timeout):
+            if not created:
+                created.append(Post.objects.create(
+                    author=self.author, text='Пока ждали'))
+                # Публикация из другого потока, как при коммите.
+                threading.Thread(
+                    target=self.notifier.publish, args=created).start()
+            return wait(after, matches, timeout)
+
+        with mock.patch.object(
+                self.notifier, 'wait', side_effect=create_while_waiting):
+            started = time.monotonic()
+            data = self.poll(timeout=5).json()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(data['count'], 1)
+        self.assertIn('Пока ждали', data['html'])
+
+    def test_post_commit_notifies(self):
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.notifier.sequence, 1)
+
+    def test_follow_feed_needs_login(self):
+        response = Client().get(reverse('posts:live_posts'), {
+            'feed': 'follow', 'since': 0, 'timeout': 0})
+        self.assertEqual(response.status_code, 403)
+
+    def test_bad_since(self):
+        self.assertEqual(self.poll(since='x').status_code, 400)
+
+    def test_non_finite_timeout(self):
+        """nan и inf не подвешивают поток на вечное ожидание."""
+        for timeout in ('nan', 'inf', '-inf'):
+            with self.subTest(timeout=timeout):
+                self.assertEqual(
+                    self.poll(timeout=timeout).status_code, 400)
@@ -0,0 +1,254 @@
+"""Миниатюры картинок постов, которые рисуются вне запроса.
+
+Для каждой картинки рисуется набор вариантов: несколько ширин
+(THUMBNAIL_WIDTHS) в WebP и в исходном формате, а также крошечная
+размытая заглушка (LQIP), которая сохраняется в самом посте как data URI.
+Шаблоны собирают из вариантов <picture> со srcset.
+
+Сохранение поста с картинкой ставит задачу render_thumbnails в очередь
+core/jobs.py. Воркер run_jobs отдаёт рисование в пул процессов
+(THUMBNAIL_WORKERS штук; при 0 рисует сам) и записывает заглушку
+в своём потоке, где у подключения к базе есть повторы и закрытие.
+Шаблоны только ищут готовые варианты и показывают заглушку, пока их
+нет; ставить работу из шаблона нельзя. Посты без вариантов (например,
+после импорта) ставит в очередь команда render_thumbnails.
+
+Модуль импортируется в дочерних процессах до django.setup(), поэтому
+модели здесь импортируются только внутри функций.
+"""
+import base64
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from PIL import Image, ImageFilter
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+POST_WIDTH, POST_HEIGHT = 960, 339
+POST_GEOMETRY = f'{POST_WIDTH}x{POST_HEIGHT}'
+POST_OPTIONS = {'padding': True, 'upscale': True}
+WIDTHS = getattr(settings, 'THUMBNAIL_WIDTHS', (480, POST_WIDTH))
+WEBP = 'WEBP'
+LQIP_WIDTH = 16
+LOCK_TIMEOUT = 5 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    """Находит готовую миниатюру так же, как sorl, но не рисует её."""
+
+    def lookup(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        thumbnail = ImageFile(name, default.storage)
+        cached = default.kvstore.get(thumbnail)
+        kvstore_cache = getattr(default.kvstore, 'cache', None)
+        if cached is None and kvstore_cache is not None:
+            # sorl кэширует и промахи; миниатюру дорисует другой процесс,
+            # поэтому промах не запоминаем.
+            kvstore_cache.delete(add_prefix(thumbnail.key))
+        return cached
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def _get_executor(broken=None):
+    """Общий пул процессов; сломанный пул заменяем новым."""
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor is broken:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=get_context('spawn'),
+                initializer=_setup_worker,
+            )
+        return _executor
+
+
+def variants(name):
+    """Варианты картинки: (формат, ширина, геометрия, опции).
+
+    Сначала идут WebP, затем исходный формат, внутри — по возрастанию
+    ширины; высота сохраняет пропорции карточки.
+    """
+    source_format = LookupBackend()._get_format(ImageFile(name))
+    formats = [WEBP] + [source_format] * (source_format != WEBP)
+    return [
+        (
+            format_, width,
+            f'{width}x{round(width * POST_HEIGHT / POST_WIDTH)}',
+            {**POST_OPTIONS, 'format': format_},
+        )
+        for format_ in formats
+        for width in sorted(WIDTHS)
+    ]
+
+
+def make_lqip(name):
+    """Размытая заглушка в несколько пикселей в виде data URI."""
+    with default.storage.open(name) as file_:
+        image = Image.open(file_)
+        image = image.convert('RGB').resize(
+            (LQIP_WIDTH, round(LQIP_WIDTH * POST_HEIGHT / POST_WIDTH)))
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=40)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{data}'
+
+
+def render(name):
+    """Рисуем все варианты картинки; выполняется в процессе пула.
+
+    Возвращает LQIP, его сохраняет в пост родительский процесс.
+    """
+    for _, _, geometry, options in variants(name):
+        get_thumbnail(name, geometry, **options)
+    return make_lqip(name)
+
+
+def _lock_key(name):
+    return f'thumbnail-job:{name}'
+
+
+def job_key(name):
+    return f'thumbnails:{name}'
+
+
+def _render_in_pool(name):
+    if not settings.THUMBNAIL_WORKERS:
+        return render(name)
+    executor = _get_executor()
+    try:
+        future = executor.submit(render, name)
+    except BrokenProcessPool:
+        future = _get_executor(broken=executor).submit(render, name)
+    return future.result()
+
+
+def save_lqip(post_id, name, lqip):
+    from core.sqlite import write_transaction
+
+    from .cache import post_changed
+    from .models import Post
+    with write_transaction():
+        # Пока картинка рисовалась, её могли заменить. Новый updated
+        # сбрасывает закэшированные карточки поста с заглушкой.
+        Post.objects.filter(pk=post_id, image=name).update(
+            lqip=lqip, updated=timezone.now())
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None:
+            # Закэшированные ленты с заглушкой больше не актуальны.
+            post_changed(post)
+
+
+def build(post_id, name):
+    """Рисуем варианты и сохраняем заглушку; выполняется в воркере."""
+    try:
+        save_lqip(post_id, name, _render_in_pool(name))
+    finally:
+        cache.delete(_lock_key(name))
+
+
+def schedule(post):
+    """Ставим варианты картинки поста в очередь в текущей транзакции.
+
+    Повторная заявка на ту же картинку, пока первая ждёт, отсекается
+    ключом задачи.
+    """
+    if not post.image:
+        return
+    from .tasks import render_thumbnails
+    name = post.image.name
+    render_thumbnails.enqueue(post.pk, name, key=job_key(name))
+    cache.set(_lock_key(name), 1, LOCK_TIMEOUT)
+
+
+def schedule_missing(redraw=False, batch_size=500):
+    """Ставим в очередь картинки без заглушки (с redraw — все картинки).
+
+    Задачи пишутся пачками, каждая пачка в своей транзакции.
+    """
+    from core.sqlite import write_transaction
+
+    from .models import Post
+    posts = Post.objects.exclude(image='').order_by('pk').only('image')
+    if not redraw:
+        posts = posts.filter(lqip='')
+    scheduled = 0
+    batch = []
+    for post in posts.iterator(chunk_size=batch_size):
+        batch.append(post)
+        if len(batch) >= batch_size:
+            with write_transaction():
+                for queued in batch:
+                    schedule(queued)
+            scheduled += len(batch)
+            batch = []
+    if batch:
+        with write_transaction():
+            for queued in batch:
+                schedule(queued)
+        scheduled += len(batch)
+    return scheduled
+
+
+def _lookup_picture(name):
+    backend = LookupBackend()
+    sources = {}
+    for format_, width, geometry, options in variants(name):
+        thumbnail = backend.lookup(name, geometry, **options)
+        if thumbnail is None:
+            return None
+        sources.setdefault(format_, []).append((width, thumbnail.url))
+    webp = sources.pop(WEBP)
+    # Если исходник сам в WebP, отдельный <source> не нужен.
+    fallback = next(iter(sources.values()), webp)
+    return {
+        'webp': _srcset(webp) if sources else '',
+        'srcset': _srcset(fallback),
+        'src': fallback[-1][1],
+        'width': POST_WIDTH,
+        'height': POST_HEIGHT,
+    }
+
+
+def _srcset(items):
+    return ', '.join(f'{url} {width}w' for width, url in items)
+
+
+def ready_picture(post):
+    """Готовые варианты картинки поста или None, пока они рисуются.
+
+    Словарь: webp и srcset — значения srcset для WebP и для исходного
+    формата, src — самый широкий вариант в исходном формате.
+    """
+    if not post.image:
+        return None
+    if cache.get(_lock_key(post.image.name)):
+        # Картинка уже рисуется: в базу за вариантами не ходим.
+        return None
+    return _lookup_picture(post.image.name)
@@ -0,0 +1,205 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+При публикации поста запись о нём раскладывается в ленты всех
+подписчиков автора, поэтому лента подписок читается одним диапазонным
+запросом по индексу (user, pub_date). Авторов с очень большим числом
+подписчиков в ленты не раскладываем — их посты подмешиваются при
+чтении.
+
+Режим автора хранится флагом AuthorStats.pulled. Перешедший порог
+автор читается напрямую сразу, а обратно в раскладку его переводит
+задача push_author: пока она не разложила посты, написанные без
+раскладки, в ленты всех подписчиков, они подмешиваются при чтении.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Q, Value, When
+
+from core.queries import outside_budget
+from core.sqlite import write_transaction
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import get_page
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 100)
+BATCH_SIZE = 500
+
+
+def is_pulled(author_id):
+    """Посты автора подмешиваются при чтении, а не раскладываются."""
+    return AuthorStats.objects.filter(user_id=author_id, pulled=True).exists()
+
+
+def follower_added(author_id):
+    """Автор, перешедший порог, с этого момента читается напрямую."""
+    AuthorStats.objects.filter(
+        user_id=author_id, pulled=False, followers_count__gt=FANOUT_LIMIT,
+    ).update(pulled=True)
+
+
+def follower_removed(author_id):
+    """Вернулся ли автор под порог (пора ставить push_author)."""
+    return AuthorStats.objects.filter(
+        user_id=author_id, pulled=True, followers_count__lte=FANOUT_LIMIT,
+    ).exists()
+
+
+def followed_authors(user):
+    """Все авторы из подписок и те из них, которых читаем напрямую."""
+    rows = Follow.objects.filter(user=user).values_list(
+        'author_id', 'author__stats__pulled')
+    author_ids, pulled = [], []
+    for author_id, is_pulled_author in rows:
+        author_ids.append(author_id)
+        if is_pulled_author:
+            pulled.append(author_id)
+    return author_ids, pulled
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладываем новый пост в ленты подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    # Число вставок растёт с числом подписчиков: это не бюджет view.
+    with outside_budget():
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        )
+
+
+def backfill(user_id, author_id, limit=None):
+    """Заполняем ленту постами автора после подписки на него.
+
+    limit — сколько последних постов разложить; возвращаем True,
+    если у автора остались посты сверх limit.
+    """
+    if is_pulled(author_id):
+        return False
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    more = False
+    if limit is not None:
+        posts = list(posts.order_by('-pub_date', '-id')[:limit + 1])
+        more = len(posts) > limit
+        posts = posts[:limit]
+    else:
+        posts = posts.iterator()
+    batch = []
+    for post_id, pub_date in posts:
+        batch.append(TimelineEntry(
+            user_id=user_id, post_id=post_id, pub_date=pub_date))
+        if len(batch) >= BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+    return more
+
+
+def push_author(author_id):
+    """Раскладываем посты автора, вернувшегося под порог, по лентам.
+
+    Вызывается в транзакции записи: пост, опубликованный параллельно,
+    либо попадёт в выборку, либо уже застанет снятый флаг и разложится
+    сам. Возвращаем число подписчиков, чьи ленты заполнены.
+    """
+    stats = AuthorStats.objects.filter(
+        user_id=author_id, pulled=True, followers_count__lte=FANOUT_LIMIT)
+    if not stats.exists():
+        # Уже разложен или снова перешёл порог.
+        return 0
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list('id', 'pub_date'))
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    pushed = 0
+    for user_id in followers.iterator():
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+        pushed += 1
+    stats.update(pulled=False)
+    return pushed
+
+
+def prune(user_id, author_id):
+    """Убираем из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Собираем все ленты заново (после заливки данных мимо сигналов).
+
+    Ленты пачки подписчиков заполняются одним INSERT ... SELECT,
+    возвращаем число записей. Всё идёт одной транзакцией записи:
+    пока лента собирается, читатели видят прежнюю, а сбой посередине
+    её не теряет.
+    """
+    tables = {
+        'entry': TimelineEntry._meta.db_table,
+        'follow': Follow._meta.db_table,
+        'post': Post._meta.db_table,
+        'stats': AuthorStats._meta.db_table,
+    }
+    sql = (
+        'INSERT INTO {entry} (user_id, post_id, pub_date) '
+        'SELECT f.user_id, p.id, p.pub_date FROM {follow} f '
+        'INNER JOIN {post} p ON p.author_id = f.author_id '
+        'LEFT JOIN {stats} s ON s.user_id = f.author_id '
+        'WHERE COALESCE(s.followers_count, 0) <= %s '
+        'AND f.user_id BETWEEN %s AND %s'
+    ).format(**tables)
+    # Подписчиков читаем пачками по ключу, а не списком целиком.
+    followers = (
+        Follow.objects.order_by('user_id')
+        .values_list('user_id', flat=True).distinct())
+    created = 0
+    last = 0
+    with write_transaction():
+        TimelineEntry.objects.all().delete()
+        AuthorStats.objects.update(pulled=Case(
+            When(followers_count__gt=FANOUT_LIMIT, then=Value(True)),
+            default=Value(False),
+        ))
+        while True:
+            batch = list(followers.filter(user_id__gt=last)[:batch_size])
+            if not batch:
+                return created
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [FANOUT_LIMIT, batch[0], batch[-1]])
+                created += cursor.rowcount
+            last = batch[-1]
+
+
+def get_follow_page(request, per_page, pulled=None):
+    """Страница ленты подписок текущего пользователя.
+
+    pulled — авторы, которых читаем напрямую, если они уже известны
+    (см. followed_authors).
+    """
+    user = request.user
+    if pulled is None:
+        pulled = followed_authors(user)[1]
+    if pulled:
+        entries = TimelineEntry.objects.filter(
+            user=user).values('post_id')
+        posts = Post.objects.filter(
+            Q(id__in=entries) | Q(author_id__in=pulled)
+        ).select_related('author', 'group')
+        return get_page(request, posts, per_page)
+    entries = TimelineEntry.objects.filter(
+        user=user).select_related('post__author', 'post__group')
+    return get_page(
+        request, entries, per_page, ordering=('-pub_date', '-post_id'),
+        transform=lambda rows: [entry.post for entry in rows])
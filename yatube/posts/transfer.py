@@ -0,0 +1,274 @@
+"""Перенос групп, постов, комментариев и подписок между окружениями.
+
+Формат — NDJSON: по одному объекту на строку, как у сериализаторов
+Django: {"model": "posts.post", "pk": 1, "fields": {...}}. Модели идут
+в порядке зависимостей (группы, посты, комментарии, подписки), поэтому
+файл читается одним проходом. Пользователи не переносятся: автор
+и подписчик записываются по username и при загрузке ищутся в базе.
+Файлы картинок копируются отдельно, в выгрузке только их имена.
+
+Выгрузка читает таблицы потоком (iterator), загрузка пишет
+bulk_create пачками, каждую в своей транзакции, и после каждой пачки
+сохраняет смещение в файле-чекпойнте. Память не зависит от объёма
+данных, а прерванную загрузку можно продолжить с последней пачки.
+Первичные ключи сохраняются: комментарии и посты находят посты
+и группы по ним. Поэтому до записи файл проверяется целиком: если
+ключ из файла занят в базе другой строкой, загрузка отказывается
+работать (ImportConflict). Строки с теми же данными — записанные
+прерванной или прошлой загрузкой — пропускаются.
+Производные данные (счётчики, ленты, поиск) в конце пересобираются.
+"""
+import datetime
+import json
+import os
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .derived import explicit_dates, rebuild_derived
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+
+# Поля выгрузки: имя в файле -> путь в ORM. Счётчики и LQIP
+# не переносим: они пересобираются на месте.
+FIELDS = {
+    Group: {
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    },
+    Post: {
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group_id',
+        'image': 'image',
+    },
+    Comment: {
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    Follow: {
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+}
+MODELS = {model._meta.label_lower: model for model in FIELDS}
+USER_FIELDS = {'author', 'user'}
+DATE_FIELDS = {'pub_date', 'created'}
+
+
+class ImportConflict(ValueError):
+    """Ключи из файла заняты в базе другими строками."""
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder обрезает их до мс."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export(output, batch_size=BATCH_SIZE, log=None):
+    """Пишем все модели в output построчно; возвращаем число строк."""
+    log = log or (lambda message: None)
+    exported = {}
+    for model, fields in FIELDS.items():
+        rows = model.objects.order_by('pk').values_list(
+            'pk', *fields.values())
+        label = model._meta.label_lower
+        exported[label] = 0
+        for pk, *values in rows.iterator(chunk_size=batch_size):
+            output.write(json.dumps({
+                'model': label,
+                'pk': pk,
+                'fields': dict(zip(fields, values)),
+            }, cls=Encoder, ensure_ascii=False) + '\n')
+            exported[label] += 1
+        log(f'{label}: {exported[label]}')
+    return exported
+
+
+class Importer:
+    """Загрузка NDJSON пачками с чекпойнтами.
+
+    Чекпойнт — смещение в байтах первой ещё не записанной строки;
+    он пишется только после коммита пачки.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, checkpoint=None,
+                 log=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint or f'{path}.checkpoint'
+        self.log = log or (lambda message: None)
+        self.created = {label: 0 for label in MODELS}
+        self.skipped = {label: 0 for label in MODELS}
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as file_:
+                return int(file_.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, offset):
+        # Через временный файл, чтобы сбой не оставил битый чекпойнт.
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as file_:
+            file_.write(str(offset))
+        os.replace(temporary, self.checkpoint)
+
+    def records(self, offset):
+        """Пары (смещение после строки, запись), начиная с offset."""
+        with open(self.path, 'rb') as file_:
+            file_.seek(offset)
+            while True:
+                line = file_.readline()
+                if not line:
+                    return
+                offset += len(line)
+                if line.strip():
+                    yield offset, json.loads(line)
+
+    def batches(self, offset):
+        """Пачки (модель, записи, смещение после пачки) с offset."""
+        label, batch = None, []
+        for offset_after, record in self.records(offset):
+            if batch and (
+                record['model'] != label or len(batch) >= self.batch_size
+            ):
+                yield label, batch, offset
+                batch = []
+            label = record['model']
+            if label not in MODELS:
+                raise ValueError(f'Неизвестная модель: {label}')
+            batch.append(record)
+            offset = offset_after
+        if batch:
+            yield label, batch, offset
+
+    def run(self, restart=False):
+        offset = 0 if restart else self.read_checkpoint()
+        if offset:
+            self.log(f'продолжаем с байта {offset}')
+        self.check_conflicts(offset)
+        for label, batch, end in self.batches(offset):
+            self.flush(label, batch, end)
+        self.finish()
+        return self.created, self.skipped
+
+    def check_conflicts(self, offset):
+        """Проверяем весь файл, пока в базу ничего не записано."""
+        for label, records, _ in self.batches(offset):
+            taken = self.existing(MODELS[label], records)
+            foreign = sorted(pk for pk, same in taken.items() if not same)
+            if foreign:
+                shown = ', '.join(map(str, foreign[:10]))
+                raise ImportConflict(
+                    f'{label}: ключи {shown} уже заняты другими строками')
+
+    def existing(self, model, records):
+        """{ключ: та же ли строка} для занятых в базе ключей пачки."""
+        fields = [
+            model._meta.get_field(name).attname for name in FIELDS[model]]
+        rows = {
+            row['pk']: row for row in model.objects.filter(
+                pk__in=[record['pk'] for record in records]
+            ).values('pk', *fields)
+        }
+        if not rows:
+            return {}
+        objects = {
+            obj.pk: obj for obj in self.build(
+                model, [record for record in records if record['pk'] in rows])
+        }
+        return {
+            pk: pk in objects and all(
+                getattr(objects[pk], field) == row[field] for field in fields)
+            for pk, row in rows.items()
+        }
+
+    def flush(self, label, records, offset):
+        model = MODELS[label]
+        with transaction.atomic():
+            # Строки, записанные до сбоя, уже есть: пропускаем.
+            taken = self.existing(model, records)
+            objects = [
+                obj for obj in self.build(model, records)
+                if obj.pk not in taken
+            ]
+            with explicit_dates(
+                *(model._meta.get_field(name) for name in DATE_FIELDS
+                  if name in FIELDS[model])
+            ):
+                # Совпавший slug группы или повторная подписка тоже
+                # пропускаются, поэтому вставленные строки пересчитываем.
+                model.objects.bulk_create(objects, ignore_conflicts=True)
+            created = model.objects.filter(
+                pk__in=[obj.pk for obj in objects]).count()
+        self.write_checkpoint(offset)
+        self.created[label] += created
+        self.skipped[label] += len(records) - created
+        self.log(f'{label}: {self.created[label]}')
+
+    def build(self, model, records):
+        """Объекты пачки; строки без автора или поста пропускаем."""
+        users = self.lookup(User, 'username', records, USER_FIELDS)
+        posts = self.lookup(Post, 'pk', records, {'post'})
+        groups = self.lookup(Group, 'pk', records, {'group'})
+        objects = []
+        for record in records:
+            values = {'pk': record['pk']}
+            for name, value in record['fields'].items():
+                if name in USER_FIELDS:
+                    if value not in users:
+                        break
+                    values[f'{name}_id'] = users[value]
+                elif name == 'post':
+                    if value not in posts:
+                        break
+                    values['post_id'] = value
+                elif name == 'group':
+                    # Группу могли не перенести: пост остаётся без неё.
+                    values['group_id'] = value if value in groups else None
+                elif name in DATE_FIELDS:
+                    values[name] = parse_datetime(value)
+                else:
+                    values[name] = value
+            else:
+                objects.append(model(**values))
+        return objects
+
+    @staticmethod
+    def lookup(model, field, records, names):
+        """Словарь значение -> id для ссылок пачки одним запросом."""
+        wanted = {
+            record['fields'][name]
+            for record in records for name in names
+            if record['fields'].get(name) is not None
+        }
+        if not wanted:
+            return {}
+        return dict(
+            model.objects.filter(**{f'{field}__in': wanted})
+            .values_list(field, 'pk'))
+
+    def finish(self):
+        # Ключи записаны явно: сдвигаем последовательности (PostgreSQL).
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), list(FIELDS))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        rebuild_derived(self.batch_size, self.log)
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
@@ -1,61 +1,144 @@
+import math
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.views.decorators.http import condition
+
+from core.middleware import tag_page
+from core.queries import query_budget
+from core.ratelimit import write_limit
+from core.replicas import replica_reads
+from core.sqlite import retry_on_locked, write_with_retry
 
+from . import cache, graph, live, thumbnails
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .paginators import CursorPaginator, get_page
+from .search import SearchPaginator
+from .timeline import followed_authors, get_follow_page
 
 COUNT_OF_POSTS = 10
+COUNT_OF_COMMENTS = 20
+
+
+# ETag страниц считается по поколениям областей, без запроса ленты:
+# на If-None-Match с тем же тегом condition отвечает 304 до рендера.
+def index_etag(request):
+    return cache.page_etag(request, cache.GLOBAL_SCOPE)
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug).values_list('pk', flat=True).first()
+    if group_id is not None:
+        return cache.page_etag(request, cache.group_scope(group_id))
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    if author_id is not None:
+        return cache.page_etag(request, cache.author_scope(author_id))
 
 
+def post_etag(request, post_id):
+    post = Post.objects.filter(
+        pk=post_id).values_list('author_id', 'group_id').first()
+    if post is not None:
+        author_id, group_id = post
+        scopes = [cache.post_scope(post_id), cache.author_scope(author_id)]
+        if group_id:
+            scopes.append(cache.group_scope(group_id))
+        return cache.page_etag(request, *scopes)
+
+
+@query_budget(3)
+@replica_reads
+@condition(etag_func=index_etag)
 def index(request):
+    tag_page(request, cache.GLOBAL_SCOPE)
     post_list = Post.objects.select_related(
         'author', 'group')
-    paginator = Paginator(post_list, COUNT_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page(request, post_list, COUNT_OF_POSTS)
     context = {
         'page_obj': page_obj,
+        'feed_version': cache.feed_version(cache.GLOBAL_SCOPE),
+        'feed_timeout': cache.feed_timeout(),
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(5)
+@replica_reads
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     """Страница сообщества для постов"""
     group = get_object_or_404(Group, slug=slug)
+    tag_page(request, cache.group_scope(group.pk))
     posts = group.posts.select_related('author')
-    paginator = Paginator(posts, COUNT_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page(request, posts, COUNT_OF_POSTS)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_version': cache.feed_version(cache.group_scope(group.pk)),
+        'feed_timeout': cache.feed_timeout(),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(6)
+@replica_reads
+@condition(etag_func=profile_etag)
 def profile(request, username):
     """Здесь код запроса к модели и создание словаря контекста"""
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    tag_page(request, cache.author_scope(author.pk))
     post_list = author.posts.select_related('group')
-    paginator = Paginator(post_list, COUNT_OF_POSTS)
     following = (
-        request.user.is_authenticated and author.following.filter(
-            user=request.user).exists())
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        request.user.is_authenticated
+        and graph.is_following(request.user.pk, author.pk))
+    page_obj = get_page(request, post_list, COUNT_OF_POSTS)
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'feed_version': cache.feed_version(cache.author_scope(author.pk)),
+        'feed_timeout': cache.feed_timeout(),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comment_paginator(post_id, *related):
+    """Комментарии поста от старых к новым, порциями по курсору."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author', *related)
+    return CursorPaginator(
+        comments, COUNT_OF_COMMENTS, ordering=('created', 'id'))
+
+
+@query_budget(5)
+@replica_reads
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     """Здесь код запроса к модели и создание словаря контекста"""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    tag_page(request, cache.post_scope(post_id))
+    # Первая порция комментариев приходит одним запросом вместе с постом;
+    # отдельно пост читаем, только если комментариев нет.
+    comments = comment_paginator(
+        post_id, 'post__author__stats', 'post__group').get_page()
+    if comments:
+        post = comments[0].post
+    else:
+        post = get_object_or_404(
+            Post.objects.select_related('author__stats', 'group'),
+            pk=post_id)
+    tag_page(request, cache.author_scope(post.author_id))
+    if post.group_id:
+        tag_page(request, cache.group_scope(post.group_id))
     form = CommentForm()
     context = {
         'post': post,
@@ -65,23 +148,114 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+@replica_reads
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или JSON."""
+    tag_page(request, cache.post_scope(post_id))
+    comments = comment_paginator(post_id).get_page(
+        request.GET.get('after'), request.GET.get('before'))
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor or None,
+        })
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@query_budget(4)
+@replica_reads
+def search(request):
+    """Поиск по тексту постов с ранжированием по релевантности."""
+    tag_page(request, cache.GLOBAL_SCOPE)
+    query = request.GET.get('q', '').strip()
+    page_obj = SearchPaginator(query, COUNT_OF_POSTS).get_page(
+        request.GET.get('after'), request.GET.get('before'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(6)
+def live_posts(request):
+    """Долгий опрос: новые посты ленты после ?since=<id поста>.
+
+    Лента — ?feed=index|group|profile|follow, для группы и профиля
+    ещё ?key=<slug или username>. Ответ — число новых постов и карточки
+    первой страницы из них.
+    """
+    try:
+        since = int(request.GET['since'])
+        timeout = float(request.GET.get('timeout', live.TIMEOUT))
+        # nan проходит float() и min/max, и ожидание не кончилось бы.
+        if not math.isfinite(timeout):
+            raise ValueError(timeout)
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {'error': 'Нужны числовой since и конечный timeout'}, status=400)
+    queryset, matches = live.resolve_feed(
+        request.GET.get('feed'), request.GET.get('key'), request.user)
+    count, posts = live.wait_for_posts(
+        queryset, matches, since, min(max(timeout, 0), live.TIMEOUT),
+        COUNT_OF_POSTS)
+    return JsonResponse({
+        'count': count,
+        'newest': posts[0].pk if posts else since,
+        'html': render_to_string(
+            'includes/live_posts.html', {'posts': posts}, request),
+    })
+
+
+def save_post(form, image_changed):
+    """Пишем пост и ставим его миниатюры в очередь одной транзакцией."""
+    post = form.instance
+    post.save()
+    form.save_m2m()
+    if image_changed:
+        thumbnails.schedule(post)
+    return post
+
+
+# Форма и картинка обрабатываются до транзакции: нормализация большой
+# картинки не держит блокировку SQLite на запись, под ней только save.
+@write_limit('post_create', '10/m', methods=('POST',))
 @login_required
+@query_budget(14)
 def post_create(request):
     form = PostForm(request.POST, files=request.FILES or None,)
     if request.method == 'POST':
         if form.is_valid():
-            form = form.save(commit=False)
-            form.author = request.user
-            form.save()
-            return redirect('posts:profile', form.author)
+            post = form.save(commit=False)
+            post.author = request.user
+            form.save_image()
+            write_with_retry(save_post, form, image_changed=True)
+            return redirect('posts:profile', post.author)
     context = {'form': form}
     return render(request, 'posts/create_post.html', context)
 
 
+@write_limit('post_edit', '30/m', methods=('POST',))
 @login_required
+@query_budget(13)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect(
             'posts:post_detail', post_id
         )
@@ -91,7 +265,13 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            # Старая заглушка не подходит к новой картинке.
+            post.lqip = ''
+        form.save(commit=False)
+        form.save_image()
+        write_with_retry(save_post, form, image_changed)
         return redirect(
             'posts:post_detail', post_id
         )
@@ -103,7 +283,10 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@write_limit('add_comment', '20/m')
 @login_required
+@retry_on_locked
+@query_budget(7)
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -116,30 +299,48 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(4)
+@replica_reads
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    )
-    paginator = Paginator(post_list, COUNT_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author_ids, pulled = followed_authors(request.user)
+    page_obj = get_follow_page(request, COUNT_OF_POSTS, pulled)
     context = {
         'page_obj': page_obj,
+        'feed_version': cache.follow_feed_version(
+            request.user.pk, author_ids),
+        'feed_timeout': cache.feed_timeout(),
     }
     return render(request, 'posts/follow.html', context)
 
 
+@write_limit('follow', '30/m')
 @login_required
+@retry_on_locked
+# Ленту подписчика заполняем пачками: у плодовитых авторов запросов больше.
+@query_budget(14)
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not follower.exists():
-        Follow.objects.create(user=request.user, author=author)
+    if (
+        request.user != author
+        and not graph.is_following(request.user.pk, author.pk)
+    ):
+        try:
+            Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            # Кэш подписок отстал от базы: подписка уже есть.
+            graph.forget(request.user.pk)
     return redirect('posts:profile', username=author.username)
 
 
+@write_limit('follow', '30/m')
 @login_required
+@retry_on_locked
+@query_budget(9)
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    deleted, _ = Follow.objects.filter(
+        user=request.user, author=author).delete()
+    if not deleted:
+        # Подписки нет, а кнопка «Отписаться» была: кэш отстал.
+        graph.forget(request.user.pk)
     return redirect('posts:profile', username=author.username)
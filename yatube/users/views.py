@@ -6,11 +6,18 @@ from django.shortcuts import redirect
 # Функция reverse_lazy позволяет получить URL по параметрам функции path()
 # Берём, тоже пригодится
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+
+from core.ratelimit import write_limit
 
 # Импортируем класс формы, чтобы сослаться на неё во view-классе
 from .forms import CreationForm
 
 
+# Регистрации ограничиваем по IP: пользователя у запроса ещё нет.
+@method_decorator(
+    write_limit('signup', '5/h', key='ip', methods=('POST',)),
+    name='dispatch')
 class SignUp(CreateView):
     form_class = CreationForm
     # После успешной регистрации перенаправляем пользователя на главную.
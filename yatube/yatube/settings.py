@@ -4,6 +4,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TEMP_DIR = os.path.join(BASE_DIR, 'templates')
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+# Адрес сайта для ссылок в письмах.
+SITE_URL = 'http://localhost:8000'
 
 
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -40,6 +43,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.queries.QueryBudgetMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,12 +86,78 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Реплики только для чтения (core/replicas.py). Локально реплика — второй
+# файл SQLite, который копирует из default команда sync_replica;
+# включается переменной окружения YATUBE_REPLICA с путём к файлу.
+if os.environ.get('YATUBE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
     }
-}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи клиент читает из primary, а не с реплики.
+REPLICA_STICKY_SECONDS = 5
+# Боевой режим SQLite (core/sqlite.py): WAL и прагмы SQLITE_PRAGMAS
+# на каждом подключении. Включается переменной YATUBE_SQLITE_PRODUCTION;
+# WAL и статистику обслуживает команда sqlite_maintenance.
+SQLITE_PRODUCTION = bool(os.environ.get('YATUBE_SQLITE_PRODUCTION'))
+
+# Поколения кэша (core/generations.py) сдвигаются в процессе, который
+# записал данные, а читаются всеми: веб-процессам и воркеру run_jobs
+# нужен общий кэш. YATUBE_MEMCACHED (host:port) включает memcached
+# (клиент python-memcached), где incr атомарен. Без него
+# у каждого процесса свой LocMemCache — так запускается только один
+# процесс (runserver, тесты): иначе чужие записи видны лишь по таймауту.
+if os.environ.get('YATUBE_MEMCACHED'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['YATUBE_MEMCACHED'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Ленты постов кэшируются надолго: ключ фрагмента включает поколение
+# области (см. posts/cache.py), которое меняется при записи поста.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Страницы для анонимов без cookies кэшируются целиком и сбрасываются
+# по тегам (core/middleware.py). 0 отключает кэш страниц.
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Сколько процессов рисуют миниатюры картинок постов (posts/thumbnails.py).
+# 0 — рисовать сразу в процессе запроса.
+THUMBNAIL_WORKERS = 2
+# Ширины вариантов картинки поста для srcset (WebP и исходный формат).
+THUMBNAIL_WIDTHS = (480, 960)
+# Загрузки пишутся во временный файл и обрезаются после MAX_UPLOAD_SIZE
+# байт (core/uploads.py). Картинки постов больше MAX_IMAGE_PIXELS (во всех
+# кадрах) или с анимацией длиннее MAX_IMAGE_FRAMES кадров отклоняются,
+# а остальные уменьшаются до MAX_IMAGE_DIMENSION по большей стороне
+# и сохраняются без EXIF (posts/images.py).
+FILE_UPLOAD_HANDLERS = ['core.uploads.BoundedTemporaryFileUploadHandler']
+MAX_UPLOAD_SIZE = 10 * 2 ** 20
+MAX_IMAGE_PIXELS = 50_000_000
+MAX_IMAGE_FRAMES = 200
+MAX_IMAGE_DIMENSION = 2048
+# Что делать, если view сделал больше SQL-запросов, чем объявлено
+# в @query_budget (core/queries.py): 'warn' — записать в лог,
+# 'raise' — упасть, 'off' — не считать запросы вовсе. 'raise' ставит
+# тестовый раннер: на сайте ответ уже готов, и падать поздно.
+QUERY_BUDGET_MODE = 'warn'
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Частоты пишущих view ({имя: '10/m'}, None — без ограничения) поверх
+# значений в @write_limit, см. core/ratelimit.py.
+RATE_LIMITS = {}
+# Пишущие view отвечают 429 сразу, если в процессе идёт столько записей
+# или их средняя длительность больше стольких секунд.
+WRITE_SHED_QUEUE = 8
+WRITE_SHED_LATENCY = 2.0
 
 
 # Password validation
@@ -130,3 +202,12 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Авторы с большим числом подписчиков не раскладываются в ленты подписок,
+# их посты подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько постов автора попадает в ленту сразу при подписке; остальные
+# раскладывает фоновая задача (воркер: manage.py run_jobs).
+TIMELINE_BACKFILL_LIMIT = 100
+# Дайджест о новых постах уходит подписчикам не раньше чем через
+# столько секунд после первого поста в нём.
+DIGEST_DELAY = 10 * 60